@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from navigator import DependencyGraph, build_dependency_graph, parse_code  # noqa: E402
+from synthetic import generate_tree  # noqa: E402
+
+
+def build_graph_linear_scan(source_dir):
+    """Reference edge building that scans every node per dependency, as navigator used to."""
+    graph = DependencyGraph()
+    all_components = []
+    for root, _, files in os.walk(source_dir):
+        for file in files:
+            if file.endswith('.py'):
+                components = parse_code(os.path.join(root, file))
+                for comp in components:
+                    graph.add_node(comp)
+                all_components.extend(components)
+    for component in all_components:
+        for dep in list(component.dependencies):
+            matches = [node for node in graph.nodes.values() if node.name == dep.name and node.type == dep.type]
+            for matched_comp in matches:
+                graph.add_edge(component, matched_comp)
+    return graph
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main(sizes, functions_per_file, calls_per_function, linear_scan_limit, workers):
+    print(f"{'files':>8} {'components':>11} {'edges':>9} {'indexed (s)':>12} {'linear scan (s)':>16}")
+    for num_files in sizes:
+        with tempfile.TemporaryDirectory() as source_dir:
+            generate_tree(source_dir, num_files, functions_per_file, calls_per_function)
+            indexed_time, graph = time_call(build_dependency_graph, source_dir, workers)
+            edges = sum(len(targets) for targets in graph.edges.values())
+            linear_time = '-'
+            if num_files <= linear_scan_limit:
+                linear_time = f"{time_call(build_graph_linear_scan, source_dir)[0]:.3f}"
+        print(f"{num_files:>8} {len(graph.nodes):>11} {edges:>9} {indexed_time:>12.3f} {linear_time:>16}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dependency graph construction against repo size")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[100, 500, 1000, 2000, 5000],
+                        help="Numbers of files to generate")
+    parser.add_argument("--functions_per_file", type=int, default=10, help="Functions per generated module")
+    parser.add_argument("--calls_per_function", type=int, default=3, help="Cross-module calls per function")
+    parser.add_argument("--linear_scan_limit", type=int, default=500,
+                        help="Largest tree (in files) to also time with the old linear-scan resolver")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    args = parser.parse_args()
+
+    main(args.sizes, args.functions_per_file, args.calls_per_function, args.linear_scan_limit, args.workers)
@@ -0,0 +1,137 @@
+import argparse
+import ast
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from navigator import DependencyGraph, ImportResolver, RecordVisitor, build_dependency_graph  # noqa: E402
+from synthetic import generate_tree  # noqa: E402
+
+MODES = ('legacy', 'compact')
+DEFINITION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+class LegacyComponent:
+    """The component record navigator used before: AST node plus one object per call site."""
+
+    def __init__(self, name, component_type, filepath, node):
+        self.name = name
+        self.component_id = f"{filepath}:{name}:{component_type}"
+        self.type = component_type
+        self.filepath = filepath
+        self.node = node
+        self.lineno = getattr(node, 'lineno', None)
+        self.end_lineno = getattr(node, 'end_lineno', self.lineno)
+        self.dependencies = set()
+        self.qualifier = None
+
+    def __hash__(self):
+        return hash((self.name, self.filepath, self.type))
+
+    def __eq__(self, other):
+        return (self.name, self.filepath, self.type) == (other.name, other.filepath, other.type)
+
+
+def build_graph_legacy(source_dir):
+    """Reference graph build that keeps every tree alive through the components' nodes."""
+    graph = DependencyGraph()
+    all_components = []
+    for root, _, files in os.walk(source_dir):
+        for file in files:
+            if not file.endswith('.py'):
+                continue
+            filepath = os.path.join(root, file)
+            with open(filepath, 'r', encoding='utf-8') as f:
+                tree = ast.parse(f.read())
+            visitor = RecordVisitor()
+            visitor.visit(tree)
+            graph.imports[filepath] = visitor.imports
+            nodes = {(node.name, node.lineno): node for node in ast.walk(tree) if isinstance(node, DEFINITION_NODES)}
+            for name, component_type, lineno, _, callees in visitor.records:
+                component = LegacyComponent(name, component_type, filepath, nodes[(name, lineno)])
+                for callee_name, callee_type, qualifier in callees:
+                    callee = LegacyComponent(callee_name, callee_type, None, None)
+                    callee.qualifier = qualifier
+                    component.dependencies.add(callee)
+                graph.add_node(component)
+                all_components.append(component)
+
+    resolver = ImportResolver(graph, source_dir)
+    for component in all_components:
+        for dep in list(component.dependencies):
+            for matched_comp in resolver.resolve(component, dep):
+                graph.add_edge(component, matched_comp)
+    return graph
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode, source_dir):
+    """Build the graph one way in this process and report its peak memory."""
+    start_rss = peak_rss_mb()
+    start = time.perf_counter()
+    if mode == 'legacy':
+        graph = build_graph_legacy(source_dir)
+    else:
+        # Parse in-process so the parsers' memory is counted as it is for the legacy build
+        graph = build_dependency_graph(source_dir, 1)
+    elapsed = time.perf_counter() - start
+    return {
+        'mode': mode,
+        'seconds': elapsed,
+        'components': len(graph.nodes),
+        'edges': sum(len(targets) for targets in graph.edges.values()),
+        'start_rss_mb': start_rss,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def main(num_files, functions_per_file, calls_per_function, output):
+    with tempfile.TemporaryDirectory() as source_dir:
+        generate_tree(source_dir, num_files, functions_per_file, calls_per_function, seed=0)
+        results = {}
+        for mode in MODES:
+            # A fresh process per mode so one build's peak does not hide the other's
+            completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode,
+                                        '--source_dir', source_dir],
+                                       check=True, stdout=subprocess.PIPE, text=True)
+            results[mode] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    print(f"{num_files} files, {results['compact']['components']} components, {results['compact']['edges']} edges")
+    print(f"{'mode':<8} {'seconds':>8} {'peak RSS (MB)':>14} {'graph (MB)':>11}")
+    for mode in MODES:
+        r = results[mode]
+        print(f"{mode:<8} {r['seconds']:>8.2f} {r['peak_rss_mb']:>14.0f} {r['peak_rss_mb'] - r['start_rss_mb']:>11.0f}")
+    legacy, compact = results['legacy'], results['compact']
+    saved = (legacy['peak_rss_mb'] - legacy['start_rss_mb']) / max(compact['peak_rss_mb'] - compact['start_rss_mb'], 1e-9)
+    print(f"Graph build memory reduced {saved:.1f}x")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({'num_files': num_files, 'results': results}, f, indent=2)
+        print(f"Wrote results to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare peak memory of the legacy and compact dependency graph builds")
+    parser.add_argument("--num_files", type=int, default=5000, help="Files in the synthetic tree")
+    parser.add_argument("--functions_per_file", type=int, default=10, help="Functions per generated module")
+    parser.add_argument("--calls_per_function", type=int, default=3, help="Cross-module calls per function")
+    parser.add_argument("--output", type=str, default=None, help="Write JSON results to this path")
+    parser.add_argument("--child", type=str, choices=MODES, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--source_dir", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_mode(args.child, args.source_dir)))
+    else:
+        main(args.num_files, args.functions_per_file, args.calls_per_function, args.output)
@@ -0,0 +1,173 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from navigator import build_dependency_graph  # noqa: E402
+from agents.orchestrator import Orchestrator  # noqa: E402
+from agents.reader import Reader  # noqa: E402
+from agents.searcher import Searcher  # noqa: E402
+from agents.usage_index import UsageIndex  # noqa: E402
+from agents.writer import Writer  # noqa: E402
+from fake_llm import FakeLLMClient  # noqa: E402
+from synthetic import generate_tree  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+STAGES = ('build_dependency_graph', 'topological_sort', 'searcher_search', 'insert_docstrings_bulk', 'orchestrator_run')
+
+
+def best_of(repeat, func):
+    """Run func repeat times and return (fastest wall time, last result)."""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_stages(source_dir, work_dir, repeat, parse_workers, llm_latency, workers):
+    timings = {}
+    timings['build_dependency_graph'], graph = best_of(repeat, lambda: build_dependency_graph(source_dir, parse_workers))
+    timings['topological_sort'], _ = best_of(repeat, graph.topological_sort)
+
+    components = list(graph.nodes.values())
+    reader = Reader(graph)
+    requests = [reader.analyze_component(component) for component in components]
+    searcher = Searcher(source_dir, UsageIndex(source_dir).build())
+    timings['searcher_search'], _ = best_of(repeat, lambda: [searcher.search(dict(request)) for request in requests])
+
+    by_file = defaultdict(list)
+    for component in components:
+        by_file[component.filepath].append({
+            'name': component.name,
+            'type': component.type,
+            'lineno': component.lineno,
+            'docstring': FakeLLMClient.docstring_for(component.name),
+        })
+    writer = Writer(source_dir, work_dir)
+    sources = {filepath: writer.source_store.text(filepath) for filepath in by_file}
+    timings['insert_docstrings_bulk'], _ = best_of(repeat, lambda: [
+        writer.insert_docstrings_bulk(sources[filepath], file_components)
+        for filepath, file_components in by_file.items()])
+
+    def run_end_to_end():
+        output_dir = os.path.join(work_dir, 'output')
+        shutil.rmtree(output_dir, ignore_errors=True)
+        llm_client = FakeLLMClient(latency=llm_latency)
+        orchestrator = Orchestrator(graph, source_dir, output_dir, llm_client, workers=workers)
+        with contextlib.redirect_stdout(io.StringIO()):
+            orchestrator.run()
+        return llm_client
+
+    timings['orchestrator_run'], llm_client = best_of(repeat, run_end_to_end)
+    return {
+        'components': len(components),
+        'files': len(by_file),
+        'llm_calls': llm_client.calls,
+        'seconds': timings,
+    }
+
+
+def compare(results, baseline, tolerance, min_seconds):
+    """Return a list of (size, stage, baseline seconds, current seconds) that regressed."""
+    regressions = []
+    print(f"{'files':>8} {'stage':<24} {'baseline (s)':>13} {'current (s)':>12} {'ratio':>7}")
+    for size, result in results['sizes'].items():
+        base = baseline.get('sizes', {}).get(size)
+        if base is None:
+            continue
+        for stage in STAGES:
+            if stage not in base['seconds'] or stage not in result['seconds']:
+                continue
+            before, after = base['seconds'][stage], result['seconds'][stage]
+            ratio = after / before if before else float('inf')
+            regressed = after > before * (1 + tolerance) and after - before > min_seconds
+            flag = '  REGRESSION' if regressed else ''
+            print(f"{size:>8} {stage:<24} {before:>13.4f} {after:>12.4f} {ratio:>7.2f}{flag}")
+            if regressed:
+                regressions.append((size, stage, before, after))
+    return regressions
+
+
+def main(sizes, functions_per_file, calls_per_function, cycles, repeat, parse_workers, llm_latency, workers,
+         output, baseline_path, update_baseline, tolerance, min_seconds):
+    config = {
+        'functions_per_file': functions_per_file,
+        'calls_per_function': calls_per_function,
+        'cycles': cycles,
+        'repeat': repeat,
+        'llm_latency': llm_latency,
+        'workers': workers,
+    }
+    results = {
+        'config': config,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'sizes': {},
+    }
+    for num_files in sizes:
+        with tempfile.TemporaryDirectory() as work_dir:
+            source_dir = os.path.join(work_dir, 'src')
+            generate_tree(source_dir, num_files, functions_per_file, calls_per_function, cycles)
+            result = bench_stages(source_dir, work_dir, repeat, parse_workers, llm_latency, workers)
+        results['sizes'][str(num_files)] = result
+        timings = ', '.join(f"{stage} {result['seconds'][stage]:.4f}s" for stage in STAGES)
+        print(f"{num_files} files, {result['components']} components: {timings}")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote results to {output}")
+
+    if update_baseline:
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Updated baseline {baseline_path}")
+        return 0
+
+    if not os.path.isfile(baseline_path):
+        print(f"No baseline at {baseline_path}; run with --update_baseline to create one.")
+        return 0
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('config') != config:
+        print(f"Warning: baseline was recorded with a different configuration: {baseline.get('config')}")
+    regressions = compare(results, baseline, tolerance, min_seconds)
+    if regressions:
+        print(f"{len(regressions)} stage(s) slower than the baseline by more than {tolerance:.0%}")
+        return 1
+    print("No regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each pipeline stage on synthetic trees and compare with a baseline")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[50, 200], help="Numbers of files to generate")
+    parser.add_argument("--functions_per_file", type=int, default=10, help="Functions per generated module")
+    parser.add_argument("--calls_per_function", type=int, default=3, help="Cross-module calls per function")
+    parser.add_argument("--cycles", type=int, default=5, help="Back-calls that close dependency cycles")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the fastest is reported")
+    parser.add_argument("--parse_workers", type=int, default=1, help="Parser processes for build_dependency_graph")
+    parser.add_argument("--llm_latency", type=float, default=0.0, help="Seconds the fake LLM sleeps per batch")
+    parser.add_argument("--workers", type=int, default=1, help="Concurrent generation batches in the end-to-end run")
+    parser.add_argument("--output", type=str, default=None, help="Write JSON results to this path")
+    parser.add_argument("--baseline", type=str, default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--update_baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown relative to the baseline")
+    parser.add_argument("--min_seconds", type=float, default=0.05, help="Ignore slowdowns smaller than this many seconds")
+    args = parser.parse_args()
+
+    sys.exit(main(args.sizes, args.functions_per_file, args.calls_per_function, args.cycles, args.repeat,
+                  args.parse_workers, args.llm_latency, args.workers, args.output, args.baseline,
+                  args.update_baseline, args.tolerance, args.min_seconds))
@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from navigator import build_dependency_graph  # noqa: E402
+from agents.orchestrator import Orchestrator  # noqa: E402
+from agents.prompt_builder import FEW_SHOT_PREFIX, docstring_token_limit  # noqa: E402
+from agents.verifier import Verifier  # noqa: E402
+from synthetic import generate_tree  # noqa: E402
+
+MODES = ('fp32', 'int8', 'lookup')
+
+
+def build_corpus(source_dir, num_components, work_dir):
+    """Prompts, token limits and sources for the first num_components components, in a stable order."""
+    graph = build_dependency_graph(source_dir, 1)
+    # Nothing is written, but the orchestrator creates its output directory
+    orchestrator = Orchestrator(graph, source_dir, os.path.join(work_dir, 'out'))
+    corpus = []
+    for key in sorted(graph.nodes)[:num_components]:
+        context = orchestrator.build_context(graph.nodes[key])
+        corpus.append({
+            'component_id': context['component_id'],
+            'source_code': context['source_code'],
+            'prompt': orchestrator.writer.prompt_builder.build(context)[0],
+            'limit': docstring_token_limit(context['source_code']),
+        })
+    return corpus
+
+
+def run_mode(mode, corpus, model, num_threads, num_interop_threads, batch_size):
+    """Load the model in one configuration, generate for the corpus and score the output."""
+    from backends.local import LocalLLMClient
+
+    client = LocalLLMClient(model, quantize=mode == 'int8', num_threads=num_threads,
+                            num_interop_threads=num_interop_threads, temperature=0, speculative=mode == 'lookup')
+    client.set_prompt_prefix(FEW_SHOT_PREFIX)
+    start = time.perf_counter()
+    outputs = client.generate_docstrings([item['prompt'] for item in corpus], [item['limit'] for item in corpus],
+                                         batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    output_tokens = sum(client.count_tokens(text) for text in outputs)
+
+    verifier = Verifier()
+    reports = [verifier.static_check({'component_id': item['component_id'], 'source_code': item['source_code'],
+                                      'docstring': text})
+               for item, text in zip(corpus, outputs)]
+    return {
+        'mode': mode,
+        'seconds': elapsed,
+        'output_tokens': output_tokens,
+        'tokens_per_second': output_tokens / elapsed if elapsed else 0.0,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'static_pass': sum(report['status'] == "PASS" for report in reports),
+        'static_warning': sum(report['status'] == "WARNING" for report in reports),
+        'static_fail': sum(report['status'] == "FAIL" for report in reports),
+        'mean_confidence': sum(report['confidence'] for report in reports) / len(reports),
+        'speculation': client.stats_summary(),
+        'outputs': outputs,
+    }
+
+
+def main(source_dir, num_components, model, num_threads, num_interop_threads, batch_size, output, modes=MODES):
+    with tempfile.TemporaryDirectory() as work_dir:
+        if source_dir is None:
+            source_dir = os.path.join(work_dir, 'src')
+            generate_tree(source_dir, num_files=8, functions_per_file=6, calls_per_function=2, seed=0)
+        corpus = build_corpus(source_dir, num_components, work_dir)
+        corpus_path = os.path.join(work_dir, 'corpus.json')
+        with open(corpus_path, 'w', encoding='utf-8') as f:
+            json.dump(corpus, f)
+
+        results = {}
+        for mode in modes:
+            # A fresh process per mode keeps the peak RSS of one model from hiding the other
+            command = [sys.executable, os.path.abspath(__file__), '--child', mode, '--corpus', corpus_path,
+                       '--model', model, '--batch_size', str(batch_size)]
+            if num_threads:
+                command += ['--num_threads', str(num_threads)]
+            if num_interop_threads:
+                command += ['--num_interop_threads', str(num_interop_threads)]
+            completed = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True)
+            results[mode] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    # Greedy outputs of every mode are compared with the first one, normally fp32
+    reference = results[modes[0]]
+    agreement = {mode: sum(a == b for a, b in zip(reference['outputs'], results[mode]['outputs'])) / len(corpus)
+                 for mode in modes[1:]}
+    print(f"{len(corpus)} components, model {model}")
+    print(f"{'mode':<6} {'seconds':>8} {'tok/s':>8} {'speedup':>8} {'peak RSS (MB)':>14} {'pass':>5} {'warn':>5} "
+          f"{'fail':>5} {'confidence':>11}")
+    for mode in modes:
+        r = results[mode]
+        print(f"{mode:<6} {r['seconds']:>8.1f} {r['tokens_per_second']:>8.1f} {reference['seconds'] / r['seconds']:>7.2f}x "
+              f"{r['peak_rss_mb']:>14.0f} {r['static_pass']:>5} {r['static_warning']:>5} {r['static_fail']:>5} "
+              f"{r['mean_confidence']:>11.2f}")
+    for mode in modes[1:]:
+        print(f"Identical greedy outputs, {mode} vs {modes[0]}: {agreement[mode]:.0%}")
+    for mode in modes:
+        if results[mode]['speculation']:
+            print(f"{mode}: {results[mode]['speculation']}")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({'model': model, 'components': len(corpus), 'agreement': agreement, 'results': results}, f, indent=2)
+        print(f"Wrote results to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare fp32, int8 dynamic-quantized and prompt-lookup speculative "
+                                                 "local inference")
+    parser.add_argument("--source_dir", type=str, default=None, help="Corpus to document (default: a fixed synthetic tree)")
+    parser.add_argument("--num_components", type=int, default=24, help="Components taken from the corpus")
+    parser.add_argument("--model", type=str, default='TinyLlama/TinyLlama-1.1B-Chat-v1.0', help="Model to load")
+    parser.add_argument("--num_threads", type=int, default=None, help="Torch intra-op threads")
+    parser.add_argument("--num_interop_threads", type=int, default=None, help="Torch inter-op threads")
+    parser.add_argument("--batch_size", type=int, default=8, help="Prompts per generation batch")
+    parser.add_argument("--output", type=str, default=None, help="Write JSON results to this path")
+    parser.add_argument("--modes", type=str, nargs='+', choices=MODES, default=list(MODES),
+                        help="Configurations to run; the first is the reference for speedup and agreement")
+    parser.add_argument("--child", type=str, choices=MODES, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--corpus", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        with open(args.corpus, 'r', encoding='utf-8') as f:
+            corpus = json.load(f)
+        # Model loading logs go to stderr so the result is the only line on stdout
+        stdout, sys.stdout = sys.stdout, sys.stderr
+        result = run_mode(args.child, corpus, args.model, args.num_threads, args.num_interop_threads, args.batch_size)
+        sys.stdout = stdout
+        print(json.dumps(result))
+    else:
+        main(args.source_dir, args.num_components, args.model, args.num_threads, args.num_interop_threads,
+             args.batch_size, args.output, args.modes)
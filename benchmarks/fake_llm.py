@@ -0,0 +1,42 @@
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from backends import LLMBackend  # noqa: E402
+
+
+class FakeLLMClient(LLMBackend):
+    """
+    Deterministic stand-in for a model: the docstring is derived from a hash of
+    the prompt, and each call sleeps for latency seconds plus per_prompt_latency
+    per prompt to mimic batched inference.
+    """
+
+    model_name = 'fake-llm'
+
+    def __init__(self, latency=0.0, per_prompt_latency=0.0):
+        self.latency = latency
+        self.per_prompt_latency = per_prompt_latency
+        self.calls = 0
+        self.prompts = 0
+
+    def signature(self):
+        return {'backend': 'fake', 'model': self.model_name}
+
+    def generate_docstrings(self, prompts, max_new_tokens=None, temperature=None):
+        self.calls += 1
+        self.prompts += len(prompts)
+        delay = self.latency + self.per_prompt_latency * len(prompts)
+        if delay:
+            time.sleep(delay)
+        return [self.docstring_for(prompt) for prompt in prompts]
+
+    @staticmethod
+    def docstring_for(prompt):
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+        return (f"Synthetic summary {digest}.\n\n"
+                "Args:\n    value (int): Input value.\n\n"
+                "Returns:\n    int: Result.")
@@ -0,0 +1,89 @@
+import argparse
+import os
+import random
+
+
+def generate_tree(root, num_files=100, functions_per_file=10, calls_per_function=3, cycles=0,
+                  files_per_package=50, seed=0):
+    """
+    Write a synthetic Python source tree under root.
+
+    Every module defines uniquely named functions that call functions in earlier
+    modules through `from ... import` statements, plus a module-local `helper`
+    whose name is shared by every module. `cycles` extra calls point from an
+    earlier module to a later one, closing dependency cycles.
+
+    Returns the list of written file paths.
+    """
+    rng = random.Random(seed)
+    modules = []
+    for i in range(num_files):
+        package = f"pkg_{i // files_per_package}"
+        modules.append((package, f"mod_{i}", [f"func_{i}_{j}" for j in range(functions_per_file)]))
+
+    back_calls = {}
+    for _ in range(cycles):
+        if num_files < 2:
+            break
+        src = rng.randrange(0, num_files - 1)
+        dst = rng.randrange(src + 1, num_files)
+        back_calls.setdefault(src, []).append((dst, rng.randrange(functions_per_file)))
+
+    paths = []
+    for i, (package, module, functions) in enumerate(modules):
+        package_dir = os.path.join(root, package)
+        os.makedirs(package_dir, exist_ok=True)
+        init_path = os.path.join(package_dir, '__init__.py')
+        if not os.path.exists(init_path):
+            open(init_path, 'w').close()
+
+        imports = set()
+        bodies = []
+        for j, function in enumerate(functions):
+            callees = ['helper']
+            for _ in range(calls_per_function):
+                if i == 0:
+                    break
+                target = rng.randrange(0, i)
+                callee = modules[target][2][rng.randrange(functions_per_file)]
+                imports.add((f"{modules[target][0]}.{modules[target][1]}", callee))
+                callees.append(callee)
+            if j == 0:
+                for target, index in back_calls.get(i, []):
+                    callee = modules[target][2][index]
+                    imports.add((f"{modules[target][0]}.{modules[target][1]}", callee))
+                    callees.append(callee)
+            body = [f"def {function}(value, scale: int = 2) -> int:"]
+            body.append("    total = value * scale")
+            for callee in callees:
+                body.append(f"    total += {callee}(value) if isinstance(value, int) else 0")
+            body.append("    return total")
+            bodies.append('\n'.join(body))
+
+        header = '\n'.join(f"from {module_path} import {name}" for module_path, name in sorted(imports))
+        definitions = ["def helper(value):\n    return value + 1",
+                       f"class Handler{i}:\n    def __init__(self, value):\n        self.value = value\n\n"
+                       f"    def run(self):\n        return {functions[0]}(self.value)"]
+        definitions.extend(bodies)
+        path = os.path.join(package_dir, f"{module}.py")
+        with open(path, 'w', encoding='utf-8') as f:
+            if header:
+                f.write(header + '\n\n\n')
+            f.write('\n\n\n'.join(definitions) + '\n')
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Python source tree")
+    parser.add_argument("--output_dir", type=str, required=True, help="Directory to write the tree into")
+    parser.add_argument("--num_files", type=int, default=100, help="Number of modules")
+    parser.add_argument("--functions_per_file", type=int, default=10, help="Functions per module")
+    parser.add_argument("--calls_per_function", type=int, default=3, help="Cross-module calls per function")
+    parser.add_argument("--cycles", type=int, default=0, help="Number of back-calls that close dependency cycles")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    paths = generate_tree(args.output_dir, args.num_files, args.functions_per_file,
+                          args.calls_per_function, args.cycles, seed=args.seed)
+    print(f"Wrote {len(paths)} files to {args.output_dir}")
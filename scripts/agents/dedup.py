@@ -0,0 +1,217 @@
+import ast
+import builtins
+import hashlib
+import re
+import textwrap
+
+
+BUILTIN_NAMES = frozenset(dir(builtins)) | {'self', 'cls'}
+
+
+class LocalNames(ast.NodeVisitor):
+    """
+    Collect the names bound in function scopes: parameters, assignment targets,
+    nested definitions, import aliases and exception names. Class bodies bind
+    attributes rather than locals, and global or nonlocal names are excluded.
+    """
+
+    def __init__(self):
+        self.names = set()
+        self.declared = set()
+        self.definitions = set()
+        self.in_function = False
+
+    def bind(self, name):
+        if self.in_function and name:
+            self.names.add(name)
+
+    def visit_FunctionDef(self, node):
+        self.bind_definition(node)
+        in_function, self.in_function = self.in_function, True
+        self.generic_visit(node)
+        self.in_function = in_function
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        in_function, self.in_function = self.in_function, True
+        self.generic_visit(node)
+        self.in_function = in_function
+
+    def visit_ClassDef(self, node):
+        self.bind_definition(node)
+        in_function, self.in_function = self.in_function, False
+        self.generic_visit(node)
+        self.in_function = in_function
+
+    def bind_definition(self, node):
+        if self.in_function:
+            self.names.add(node.name)
+            self.definitions.add(id(node))
+
+    def visit_arg(self, node):
+        self.bind(node.arg)
+        self.generic_visit(node)
+
+    def visit_Name(self, node):
+        if not isinstance(node.ctx, ast.Load):
+            self.bind(node.id)
+
+    def visit_ExceptHandler(self, node):
+        self.bind(node.name)
+        self.generic_visit(node)
+
+    def visit_alias(self, node):
+        # "import os" keeps the module's name; only an alias is a local choice
+        self.bind(node.asname)
+
+    def visit_Global(self, node):
+        self.declared.update(node.names)
+
+    visit_Nonlocal = visit_Global
+
+    def local_names(self):
+        return self.names - self.declared
+
+
+class IdentifierNormalizer(ast.NodeVisitor):
+    """
+    Replace identifiers with positional placeholders in order of first use.
+    The component's own name is replaced, and so are the names bound inside it.
+    Attributes, free names such as called functions,
+    builtins, self and cls keep their names. The tree is shared with other
+    checks, so every replacement is recorded and restore() puts it back.
+    """
+
+    def __init__(self, root):
+        collector = LocalNames()
+        collector.visit(root)
+        self.root = root
+        self.renamed = {root.name} | collector.local_names()
+        self.definitions = {id(root)} | collector.definitions
+        self.names = []
+        self.placeholders = {}
+        self.replaced = []
+
+    def placeholder(self, name):
+        if name not in self.renamed or name in BUILTIN_NAMES:
+            return name
+        if name not in self.placeholders:
+            self.placeholders[name] = f"_id{len(self.names)}"
+            self.names.append(name)
+        return self.placeholders[name]
+
+    def rename(self, node, field):
+        name = getattr(node, field)
+        if name:
+            placeholder = self.placeholder(name)
+            if placeholder != name:
+                self.replaced.append((node, field, name))
+                setattr(node, field, placeholder)
+
+    def restore(self):
+        for node, field, name in reversed(self.replaced):
+            setattr(node, field, name)
+        self.replaced = []
+
+    def visit_FunctionDef(self, node):
+        # Methods are attributes of their class, so only the root and local definitions are renamed
+        if id(node) in self.definitions:
+            self.rename(node, 'name')
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_ClassDef = visit_FunctionDef
+
+    def visit_Name(self, node):
+        self.rename(node, 'id')
+
+    def visit_arg(self, node):
+        self.rename(node, 'arg')
+        self.generic_visit(node)
+
+    def visit_ExceptHandler(self, node):
+        self.rename(node, 'name')
+        self.generic_visit(node)
+
+    def visit_alias(self, node):
+        self.rename(node, 'asname')
+
+
+def fingerprint(source_code, rename_all=False, tree=None):
+    """
+    Hash the structure of one function or class, ignoring formatting, comments,
+    its own docstring and its own name (and the names bound inside it if rename_all).
+    tree: the already parsed module of source_code; it is left unchanged.
+
+    Returns:
+        tuple: (digest, names) where names are the original identifiers in placeholder
+            order, or (None, []) when the source does not parse to a single definition.
+    """
+    if tree is None:
+        try:
+            tree = ast.parse(textwrap.dedent(source_code or ''))
+        except SyntaxError:
+            return None, []
+    if len(tree.body) != 1 or not isinstance(tree.body[0], (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return None, []
+    node = tree.body[0]
+    body, name = node.body, node.name
+    if ast.get_docstring(node, clean=False) is not None:
+        node.body = body[1:] or [ast.Pass()]
+
+    normalizer = IdentifierNormalizer(node) if rename_all else None
+    try:
+        if normalizer is None:
+            # Only the definition's own name changes, no walk needed
+            names = [] if name in BUILTIN_NAMES else [name]
+            node.name = '_id0' if names else name
+        else:
+            normalizer.visit(node)
+            names = normalizer.names
+        digest = hashlib.sha256(ast.dump(node, annotate_fields=False).encode('utf-8')).hexdigest()
+    finally:
+        if normalizer is not None:
+            normalizer.restore()
+        node.body, node.name = body, name
+    return digest, names
+
+
+IDENTIFIER_SECTIONS = ('Args', 'Arguments', 'Keyword Args', 'Raises')
+SECTION_HEADER = re.compile(r'^(\s*)([A-Z][A-Za-z ]*):\s*$')
+ENTRY_NAME = re.compile(r'^(\s*\**)(\w+)(?=\s*(\([^)]*\))?\s*:)')
+CODE_SPAN = re.compile(r'(`+)(.+?)\1')
+
+
+def adapt_docstring(docstring, names_from, names_to):
+    """
+    Rewrite identifiers of the representative component into those of a duplicate.
+    Only entry names in Args and Raises sections and names in `code` spans are
+    rewritten; prose is left alone, so words that happen to match a name stay.
+    """
+    mapping = {old: new for old, new in zip(names_from, names_to) if old != new}
+    if not mapping or not docstring:
+        return docstring
+    identifier = re.compile(r'(?<![\w.])(' + '|'.join(re.escape(name) for name in sorted(mapping, key=len, reverse=True))
+                            + r')\b')
+
+    def rename_code(match):
+        return match.group(1) + identifier.sub(lambda m: mapping[m.group(1)], match.group(2)) + match.group(1)
+
+    lines = []
+    section = None
+    entry_indent = None
+    for line in docstring.split('\n'):
+        header = SECTION_HEADER.match(line)
+        if header:
+            section, entry_indent = header.group(2), None
+        elif section in IDENTIFIER_SECTIONS and line.strip():
+            indent = len(line) - len(line.lstrip())
+            if entry_indent is None:
+                entry_indent = indent
+            # Deeper lines continue the previous entry's description
+            if indent == entry_indent:
+                entry = ENTRY_NAME.match(line)
+                if entry and entry.group(2) in mapping:
+                    line = line[:entry.start(2)] + mapping[entry.group(2)] + line[entry.end(2):]
+        lines.append(CODE_SPAN.sub(rename_code, line))
+    return '\n'.join(lines)
@@ -3,56 +3,233 @@ from .reader import Reader
 from .searcher import Searcher
 from .writer import Writer
 from .verifier import Verifier
-from collections import defaultdict
+from .scheduler import DagScheduler
+from .pipeline import Stage
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from utils import SourceStore
+from tracing import NULL_TRACER
 
 
 class Orchestrator:
-    def __init__(self, graph, source_dir, output_dir, llm_client=None):
+    def __init__(self, graph, source_dir, output_dir, llm_client=None, cache=None,
+                 batch_token_budget=8192, max_batch_size=16, workers=1, usage_index=None, max_usage_refs=20,
+                 source_store=None, prompt_token_budget=1792, queue_size=64, tracer=None, dedup=True,
+                 dedup_rename=False, llm_review=True, review_rate=0.0, review_threshold=0.5, max_regenerations=1):
         self.graph = graph
         self.source_dir = source_dir
         self.output_dir = output_dir
-        self.reader = Reader()
-        self.searcher = Searcher(source_dir)
-        self.writer = Writer(source_dir, output_dir, llm_client)
-        self.verifier = Verifier()
+        self.source_store = source_store if source_store is not None else SourceStore()
+        self.tracer = tracer or NULL_TRACER
+        self.reader = Reader(graph)
+        self.searcher = Searcher(source_dir, usage_index, max_usage_refs, self.source_store)
+        self.writer = Writer(source_dir, output_dir, llm_client, cache, self.source_store, prompt_token_budget,
+                             self.tracer, dedup, dedup_rename)
+        self.verifier = Verifier(llm_client if llm_review else None, review_rate, review_threshold)
+        self.max_regenerations = max_regenerations
+        self.verification_stats = {'PASS': 0, 'WARNING': 0, 'FAIL': 0, 'reviewed': 0, 'regenerated': 0}
+        self.batch_token_budget = batch_token_budget
+        self.max_batch_size = max_batch_size
+        self.workers = workers
+        self.queue_size = queue_size
+        self.docstrings = {}
+
+        # Per-file docstring records for files that still have components in flight
+        self._file_records = defaultdict(list)
+        self._file_remaining = {}
+        self._report_stage = None
+        self._write_stage = None
 
         os.makedirs(self.output_dir, exist_ok=True)
 
-    def run(self):
-        sorted_scc_groups = self.graph.topological_sort()
-        # Flatten all components and group by file
-        file_to_components = defaultdict(list)
-        for group in sorted_scc_groups:
-            for component in group:
-                file_to_components[component.filepath].append(component)
-        for filepath, components in file_to_components.items():
-            print(f"Processing file: {filepath} with {len(components)} components")
-            self.process_file(filepath, components)
-
-    def process_file(self, filepath, components):
-        # For each component, build context and generate docstring
-        components_contexts = []
-        for component in components:
-            context = self.reader.analyze_component(component)
+    def run(self, files=None, dirty_keys=None, previous_docstrings=None, keys=None):
+        """
+        Generate docstrings in dependency order and write annotated files.
+        The condensed SCC graph is used as a task graph: a component is ready once
+        every SCC it depends on has docstrings, and ready components are batched
+        and dispatched to a pool of workers. Generated contexts stream through
+        bounded report and write stages, and each file is written and released as
+        soon as its last component is done.
+        files: optional set of file paths to write; all files when None.
+        dirty_keys: optional set of "filepath:name" keys to regenerate; components
+            outside it reuse their docstring from previous_docstrings.
+        keys: optional set of (filepath, name) node keys to process, e.g. one shard work
+            unit; the rest of the graph still supplies dependency context, and docstrings
+            of dependencies outside it are expected in self.docstrings.
+        """
+        previous_docstrings = previous_docstrings or {}
+        graph = self.graph if keys is None else self.graph.subgraph(keys)
+        compact = graph.compact()
+        scc_ids = compact.tarjan_scc()
+        sccs = [[compact.keys[node] for node in scc] for scc in scc_ids]
+        scheduler = DagScheduler(sccs, compact.condense(scc_ids))
+
+        for node_key in graph.nodes:
+            filepath = node_key[0]
+            if files is None or filepath in files:
+                self._file_remaining[filepath] = self._file_remaining.get(filepath, 0) + 1
+        scc_remaining = [len(scc) for scc in sccs]
+
+        ready = deque()
+        inflight = {}
+
+        def release(scc_indices):
+            for scc_index in scc_indices:
+                for node_key in sccs[scc_index]:
+                    ready.append((scc_index, self.graph.nodes[node_key]))
+
+        def finish(scc_index):
+            scc_remaining[scc_index] -= 1
+            if scc_remaining[scc_index] == 0:
+                release(scheduler.complete(scc_index))
+
+        release(scheduler.initial())
+        self._report_stage = Stage('report', self.report_verification, self.queue_size)
+        self._write_stage = Stage('write', self.write_file, self.queue_size)
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                while ready or inflight:
+                    # Fill idle workers with batches of ready components
+                    batch, batch_tokens = [], 0
+                    while ready and len(inflight) < self.workers:
+                        scc_index, component = ready.popleft()
+                        key = f"{component.filepath}:{component.name}"
+                        to_write = files is None or component.filepath in files
+                        regenerate = to_write and (dirty_keys is None or key in dirty_keys or key not in previous_docstrings)
+                        if not regenerate:
+                            self.complete_component(component, {
+                                'component_id': key,
+                                'name': component.name,
+                                'type': component.type,
+                                'docstring': previous_docstrings.get(key),
+                            }, to_write, report=False)
+                            finish(scc_index)
+                            continue
+
+                        context = self.build_context(component)
+                        prompt_tokens = self.writer.count_prompt_tokens(context)
+                        if batch and (batch_tokens + prompt_tokens > self.batch_token_budget
+                                      or len(batch) >= self.max_batch_size):
+                            inflight[pool.submit(self.generate_batch, batch)] = batch
+                            batch, batch_tokens = [], 0
+                        batch.append((scc_index, component, context))
+                        batch_tokens += prompt_tokens
+                    if batch:
+                        inflight[pool.submit(self.generate_batch, batch)] = batch
 
+                    if not inflight:
+                        continue
+                    self.tracer.counter('queue_depth', ready=len(ready), inflight=len(inflight),
+                                        report=self._report_stage.queue.qsize(),
+                                        write=self._write_stage.queue.qsize())
+                    done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        batch = inflight.pop(future)
+                        future.result()
+                        for scc_index, component, context in batch:
+                            self.complete_component(component, context, True)
+                            finish(scc_index)
+        finally:
+            # Drain the remaining reports and file writes before returning
+            report_stage, write_stage = self._report_stage, self._write_stage
+            self._report_stage = self._write_stage = None
+            report_stage.close()
+            write_stage.close()
+
+        if not scheduler.done():
+            raise RuntimeError("Dependency scheduler stalled before all components were processed")
+
+    def build_context(self, component):
+        context = self.reader.analyze_component(component)
+
+        with self.tracer.span('search', component=f"{component.filepath}:{component.name}"):
             searched_context = self.searcher.search(context)
 
-            dependency_sources = searched_context.get('dependency_sources', {})
-            usage_refs = searched_context.get('usage_refs', [])
-            external_refs = searched_context.get('external_refs', [])
-            context.update({
-                'dependency_sources': dependency_sources,
-                'external_refs': external_refs,
-                'usage_refs': usage_refs
-            })
-            context['name'] = component.name
-            context['type'] = component.type
-            context['component_id'] = f"{component.filepath}:{component.name}"
-            docstring = self.writer.generate_docstring(context)
-            context['docstring'] = docstring
-
-            verification_report = self.verifier.verify_docstring(context)
-            print(f"Verification report for {component.component_id}: {verification_report}")
-            components_contexts.append(context)
+        dependency_sources = searched_context.get('dependency_sources', {})
+        usage_refs = searched_context.get('usage_refs', [])
+        external_refs = searched_context.get('external_refs', [])
+        context.update({
+            'source_code': searched_context.get('source_code') or '',
+            'dependency_sources': dependency_sources,
+            'dependency_docstrings': {
+                dep_id: self.docstrings[dep_id]
+                for dep_id in context.get('dependencies', [])
+                if self.docstrings.get(dep_id)
+            },
+            'external_refs': external_refs,
+            'usage_refs': usage_refs
+        })
+        context['name'] = component.name
+        context['type'] = component.type
+        context['component_id'] = f"{component.filepath}:{component.name}"
+        return context
+
+    def generate_batch(self, batch):
+        """
+        Worker task: generate and verify docstrings for one batch of ready components.
+        Components that fail verification are regenerated with the problems found added to
+        their prompt, up to max_regenerations times each, or until a regeneration repeats itself.
+        """
+        contexts = [context for _, _, context in batch]
+        pending = contexts
+        for attempt in range(self.max_regenerations + 1):
+            docstrings = self.writer.generate_docstrings(pending, regenerate=attempt > 0)
+            if attempt > 0:
+                # A regeneration that repeats the rejected docstring would fail the same way again
+                repeated = {id(context) for context, docstring in zip(pending, docstrings)
+                            if docstring == context['docstring']}
+                docstrings = [docstring for context, docstring in zip(pending, docstrings) if id(context) not in repeated]
+                pending = [context for context in pending if id(context) not in repeated]
+                if not pending:
+                    break
+            for context, docstring in zip(pending, docstrings):
+                context['docstring'] = docstring
+            with self.tracer.span('verify', components=len(pending), attempt=attempt) as span:
+                reports = self.verifier.verify_batch(pending)
+                span.set(reviewed=sum('llm_review' in report for report in reports))
+            for context, report in zip(pending, reports):
+                report['attempts'] = attempt + 1
+                context['verification'] = report
+            pending = [context for context, report in zip(pending, reports) if report['status'] == "FAIL"]
+            if not pending:
+                break
+        # Only docstrings that passed are cached, so a rejected one is not served again next run
+        self.writer.cache_verified(contexts)
+        for context in contexts:
+            # The parsed tree is only needed until the docstring is verified
+            context.pop('tree', None)
+            context.pop('nodes', None)
+            context.pop('cached', None)
+
+    def report_verification(self, context):
+        report = context['verification']
+        self.verification_stats[report['status']] += 1
+        self.verification_stats['reviewed'] += 'llm_review' in report
+        self.verification_stats['regenerated'] += report['attempts'] > 1
+        print(f"Verification report for {context['component_id']}: {report}")
+
+    def complete_component(self, component, context, to_write, report=True):
+        if context['docstring']:
+            self.docstrings[context['component_id']] = context['docstring']
+        if report:
+            # The report stage holds the last reference to the full context
+            self._report_stage.put(context)
+        if not to_write:
+            return
+        filepath = component.filepath
+        self._file_records[filepath].append({
+            'name': context['name'],
+            'type': context['type'],
+            'lineno': component.lineno,
+            'docstring': context['docstring'],
+        })
+        self._file_remaining[filepath] -= 1
+        if self._file_remaining[filepath] == 0:
+            del self._file_remaining[filepath]
+            self._write_stage.put((filepath, self._file_records.pop(filepath)))
+
+    def write_file(self, item):
         # Save the annotated file with all docstrings inserted
-        self.writer.write_docstrings_for_file(filepath, components_contexts)
\ No newline at end of file
+        filepath, records = item
+        with self.tracer.span('write', file=filepath, components=len(records)):
+            self.writer.write_docstrings_for_file(filepath, records)
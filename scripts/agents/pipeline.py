@@ -0,0 +1,48 @@
+import queue
+import threading
+
+
+_STOP = object()
+
+
+class Stage:
+    """
+    One pipeline step running on its own thread, fed by a bounded queue.
+    put() blocks while the queue is full, so a slow stage holds back the
+    stages in front of it instead of letting work pile up in memory.
+    """
+
+    def __init__(self, name, handler, maxsize=64):
+        self.name = name
+        self.handler = handler
+        self.queue = queue.Queue(maxsize)
+        self.processed = 0
+        self.error = None
+        self.thread = threading.Thread(target=self._work, name=name, daemon=True)
+        self.thread.start()
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            if self.error is not None:
+                # Keep draining so producers never block on a failed stage
+                continue
+            try:
+                self.handler(item)
+                self.processed += 1
+            except Exception as error:
+                self.error = error
+
+    def put(self, item):
+        if self.error is not None:
+            raise RuntimeError(f"Pipeline stage {self.name} failed") from self.error
+        self.queue.put(item)
+
+    def close(self):
+        """Wait for queued items to be handled and stop the thread."""
+        self.queue.put(_STOP)
+        self.thread.join()
+        if self.error is not None:
+            raise RuntimeError(f"Pipeline stage {self.name} failed") from self.error
@@ -0,0 +1,244 @@
+import ast
+import functools
+import hashlib
+import textwrap
+
+
+FEW_SHOT_PREFIX = (
+    "Generate a Python docstring for the following code. "
+    "The docstring should summarize the component in one line, list input parameters with types and descriptions, and describe the return value. "
+    "Use Google-style docstrings.\n\n"
+    "Code:\n"
+    "def add_numbers(a: float, b: float) -> float:\n"
+    "    return a + b\n"
+    "Docstring:\n"
+    '"""\n'
+    "Add two numbers and return the result.\n\n"
+    "Args:\n"
+    "    a (float): The first number.\n"
+    "    b (float): The second number.\n\n"
+    "Returns:\n"
+    "    float: The sum of the two input numbers.\n"
+    '"""\n\n'
+    "Code:\n"
+    "class Person:\n"
+    "    def __init__(self, name: str, age: int):\n"
+    "        self.name = name\n"
+    "        self.age = age\n\n"
+    "    def greet(self) -> str:\n"
+    "        return f'Hello, my name is ' _ self.name\n"
+    "Docstring:\n"
+    '"""\n'
+    "Represents a person with a name and age.\n\n"
+    "Attributes:\n"
+    "    name (str): The name of the person.\n"
+    "    age (int): The age of the person.\n\n"
+    "Methods:\n"
+    "    greet(): Returns a greeting string.\n"
+    '"""\n\n'
+)
+
+# Prompts end inside an opened docstring, so generation can stop at the closing quotes
+DOCSTRING_OPENING = 'Docstring:\n"""\n'
+
+
+def estimate_tokens(text):
+    # Rough estimate when no tokenizer is available
+    return len(text) // 4
+
+
+def parse_component(context):
+    """
+    Parse the component's source once per context and keep the module tree with it,
+    for dedup, token limits and verification. None when the source does not parse.
+    """
+    if 'tree' not in context:
+        try:
+            context['tree'] = ast.parse(textwrap.dedent(context.get('source_code') or ''))
+        except SyntaxError:
+            context['tree'] = None
+    return context['tree']
+
+
+def component_nodes(context):
+    """
+    Every node of the component's definition, walked once per context like its tree.
+    The order differs from ast.walk; callers only count and collect.
+    """
+    if 'nodes' not in context:
+        tree = parse_component(context)
+        if tree is None or not tree.body:
+            context['nodes'] = None
+            return None
+        nodes, stack = [], [tree.body[0]]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            for field in node._fields:
+                value = getattr(node, field, None)
+                if isinstance(value, list):
+                    stack.extend(item for item in value if isinstance(item, ast.AST))
+                elif isinstance(value, ast.AST):
+                    stack.append(value)
+        context['nodes'] = nodes
+    return context['nodes']
+
+
+@functools.lru_cache(maxsize=4096)
+def signature_header(source_code):
+    """Header lines and own docstring of one function or class; dependencies recur across prompts."""
+    source_code = textwrap.dedent(source_code or '')
+    lines = source_code.splitlines()
+    try:
+        node = ast.parse(source_code).body[0]
+        header = lines[:node.body[0].lineno - 1] if node.body[0].lineno > node.lineno else lines[node.lineno - 1:node.lineno]
+        return '\n'.join(line.rstrip() for line in header), ast.get_docstring(node)
+    except (SyntaxError, IndexError, AttributeError):
+        return '\n'.join(line.rstrip() for line in lines[:1]), None
+
+
+def signature_of(source_code, docstring=None):
+    """
+    Reduce a function or class to its header lines plus a one-line summary.
+    docstring: generated docstring to summarize when the code has none of its own.
+    """
+    signature, own_docstring = signature_header(source_code or '')
+    docstring = own_docstring or docstring
+    summary = ''
+    if docstring:
+        summary = docstring.strip().strip('"\'').strip().split('\n', 1)[0]
+    if summary:
+        signature += f"\n    # {summary}"
+    return signature
+
+
+def docstring_token_limit(source_code, cap=200, tree=None, nodes=None):
+    """
+    Estimate how many tokens a docstring for this component needs from its signature:
+    a summary line, one line per parameter, a Returns section when a value is returned,
+    Raises entries, and for classes a line per public attribute and method.
+    tree, nodes: the already parsed module of source_code and the nodes of its
+        definition, see parse_component and component_nodes.
+    """
+    try:
+        node = (tree or ast.parse(textwrap.dedent(source_code or ''))).body[0]
+    except (SyntaxError, IndexError):
+        return cap
+    tokens = 40
+    if isinstance(node, ast.ClassDef):
+        attributes, methods = set(), 0
+        for item in node.body:
+            if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                methods += not item.name.startswith('_')
+                for sub in ast.walk(item):
+                    if isinstance(sub, ast.Attribute) and isinstance(sub.ctx, ast.Store) and not sub.attr.startswith('_'):
+                        attributes.add(sub.attr)
+        tokens += 16 * len(attributes) + 16 * methods
+    elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        args = node.args
+        params = [a.arg for a in args.posonlyargs + args.args + args.kwonlyargs if a.arg not in ('self', 'cls')]
+        tokens += 20 * (len(params) + bool(args.vararg) + bool(args.kwarg))
+        returns_value = node.returns is not None
+        raises = 0
+        for sub in nodes or ast.walk(node):
+            if isinstance(sub, (ast.Return, ast.Yield, ast.YieldFrom)):
+                returns_value = returns_value or sub.value is not None
+            elif isinstance(sub, ast.Raise):
+                raises += 1
+        tokens += 24 * returns_value
+        tokens += 16 * min(3, raises)
+    return max(48, min(cap, tokens))
+
+
+class PromptBuilder:
+    """
+    Packs the context for one component into a token budget.
+    Pieces are ranked: the component's own source first, then dependency
+    signatures, then a few usage examples, then external references; lower
+    ranked pieces are dropped once the budget is spent.
+    """
+
+    def __init__(self, count_tokens=None, token_budget=1792, max_usage_examples=3):
+        self.count_tokens = count_tokens or estimate_tokens
+        self.token_budget = token_budget
+        self.max_usage_examples = max_usage_examples
+
+    def signature(self):
+        """Identify the prompt layout for cache keys."""
+        prefix_hash = hashlib.sha256(FEW_SHOT_PREFIX.encode('utf-8')).hexdigest()[:16]
+        return f"prompt-builder:v2:{prefix_hash}:{self.token_budget}:{self.max_usage_examples}"
+
+    def build(self, context):
+        """
+        Returns:
+            tuple: (prompt, stats) where stats holds 'tokens_used' and 'tokens_dropped'.
+        """
+        source_code = context.get('source_code', '') or ''
+        dependency_sources = context.get('dependency_sources', {}) or {}
+        dependency_docstrings = context.get('dependency_docstrings', {}) or {}
+        usage_refs = context.get('usage_refs', []) or []
+        external_refs = context.get('external_refs', []) or []
+
+        fixed = FEW_SHOT_PREFIX + "Source Code:\n\n\n" + DOCSTRING_OPENING
+        used = self.count_tokens(fixed)
+        dropped = 0
+
+        source_tokens = self.count_tokens(source_code)
+        if used + source_tokens > self.token_budget:
+            source_code, source_tokens, truncated_tokens = self.truncate(source_code, self.token_budget - used)
+            dropped += truncated_tokens
+        used += source_tokens
+
+        sections = []
+        ranked = [
+            ("Dependencies:", [signature_of(code, dependency_docstrings.get(dep_id))
+                               for dep_id, code in dependency_sources.items()]),
+            ("Usage references:", [f"{ref['file']}:{ref['line']}: {ref['code']}"
+                                   for ref in usage_refs[:self.max_usage_examples]]),
+            ("External references:", [str(ref) for ref in external_refs]),
+        ]
+        for title, pieces in ranked:
+            kept = []
+            header_tokens = self.count_tokens(f"{title}\n\n")
+            for piece in pieces:
+                piece_tokens = self.count_tokens(piece + "\n")
+                cost = piece_tokens + (0 if kept else header_tokens)
+                if used + cost <= self.token_budget:
+                    kept.append(piece)
+                    used += cost
+                else:
+                    dropped += piece_tokens
+            if kept:
+                sections.append(title + "\n" + "\n".join(kept) + "\n\n")
+
+        prompt = FEW_SHOT_PREFIX + "Source Code:\n" + source_code.rstrip('\n') + "\n\n" + "".join(sections) + DOCSTRING_OPENING
+        return prompt, {'tokens_used': used, 'tokens_dropped': dropped}
+
+    def with_feedback(self, prompt, report, max_issues=4):
+        """
+        Add the problems found in a rejected docstring to its prompt, just before the
+        opened docstring, so a regeneration asks for a different answer.
+        """
+        if not report:
+            return prompt
+        issues = [issue for issue in report.get('issues', []) if issue != "LLM review failed the docstring."]
+        issues = issues[:max_issues]
+        if report.get('llm_review'):
+            issues.append(f"Reviewer: {' '.join(report['llm_review'].split())}")
+        if not issues:
+            return prompt
+        feedback = "A previous docstring was rejected:\n" + "".join(f"- {issue}\n" for issue in issues) + "\n"
+        return prompt[:len(prompt) - len(DOCSTRING_OPENING)] + feedback + DOCSTRING_OPENING
+
+    def truncate(self, source_code, budget):
+        """Keep the leading lines of source_code that fit in budget tokens."""
+        kept, kept_tokens = [], 0
+        lines = source_code.splitlines(keepends=True)
+        for i, line in enumerate(lines):
+            line_tokens = self.count_tokens(line)
+            if kept_tokens + line_tokens > budget:
+                dropped_tokens = self.count_tokens(''.join(lines[i:]))
+                return ''.join(kept), kept_tokens, dropped_tokens
+            kept.append(line)
+            kept_tokens += line_tokens
+        return ''.join(kept), kept_tokens, 0
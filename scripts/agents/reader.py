@@ -1,18 +1,33 @@
+def span_of(component):
+    return (component.lineno, component.end_lineno)
+
+
 class Reader:
-    def __init__(self):
-        pass
+    def __init__(self, graph=None):
+        self.graph = graph
 
     def analyze_component(self, component):
-        dependency_ids = [dep.component_id
-                          for dep 
-                          in component.dependencies]
+        dependency_spans = {}
+        if self.graph is not None:
+            # Resolved callees from the dependency graph, keyed like the orchestrator's component ids
+            dependency_ids = []
+            for node_key in sorted(self.graph.edges.get((component.filepath, component.name), ())):
+                dep_id = f"{node_key[0]}:{node_key[1]}"
+                dependency_ids.append(dep_id)
+                dependency_spans[dep_id] = span_of(self.graph.nodes[node_key])
+        else:
+            dependency_ids = [dep.component_id
+                              for dep
+                              in component.dependencies]
         
         external_refs = []
         usage_refs = component.type == 'class'
 
         context_request = {
             'component_id': component.component_id,
+            'span': span_of(component),
             'dependencies': dependency_ids,
+            'dependency_spans': dependency_spans,
             'external_refs': external_refs,
             'usage_refs': usage_refs,
         }
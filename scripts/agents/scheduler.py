@@ -0,0 +1,35 @@
+from collections import defaultdict
+
+
+class DagScheduler:
+    """
+    Tracks readiness of SCC groups in the condensed dependency graph.
+    condensed is the CompactGraph of SCCs, whose successors of an SCC index are the
+    SCC indices it depends on; an SCC becomes ready once every SCC it depends on
+    has completed.
+    """
+
+    def __init__(self, sccs, condensed):
+        self.sccs = sccs
+        self.waiting_on = [len(condensed.successors(i)) for i in range(len(sccs))]
+        self.dependents = defaultdict(list)
+        for scc in range(len(sccs)):
+            for dependency in condensed.successors(scc):
+                self.dependents[dependency].append(scc)
+        self.completed = 0
+
+    def initial(self):
+        return [i for i, count in enumerate(self.waiting_on) if count == 0]
+
+    def complete(self, scc):
+        """Mark an SCC as done and return the SCCs that became ready because of it."""
+        self.completed += 1
+        ready = []
+        for dependent in self.dependents.get(scc, ()):
+            self.waiting_on[dependent] -= 1
+            if self.waiting_on[dependent] == 0:
+                ready.append(dependent)
+        return ready
+
+    def done(self):
+        return self.completed == len(self.sccs)
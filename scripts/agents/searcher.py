@@ -1,29 +1,33 @@
 import os
-import re
+from utils import SourceStore
+from .usage_index import UsageIndex
 
 class Searcher:
-    def __init__(self, source_dir):
+    def __init__(self, source_dir, usage_index=None, max_usage_refs=20, source_store=None):
         self.source_dir = source_dir
+        self.usage_index = usage_index
+        self.max_usage_refs = max_usage_refs
+        self.source_store = source_store if source_store is not None else SourceStore()
     
-    def load_component_code(self, component_id):
+    def load_component_code(self, component_id, span=None):
         file_path, component_name = component_id.split(':', 1)
-        full_path = os.path.join(self.source_dir, file_path)
+        full_path = file_path if os.path.isfile(file_path) else os.path.join(self.source_dir, file_path)
 
         if not os.path.isfile(full_path):
             return None
 
-        with open(full_path, 'r', encoding='utf-8') as file:
-            code = file.read()
-        
-        return code
+        if span:
+            return self.source_store.segment(full_path, span[0], span[1])
+        return self.source_store.text(full_path)
     
     def search(self, context_request):
-        main_code = self.load_component_code(context_request['component_id'])
+        main_code = self.load_component_code(context_request['component_id'], context_request.get('span'))
 
         dependency_sources = {}
 
+        dependency_spans = context_request.get('dependency_spans', {})
         for dep_id in context_request.get('dependencies', []):
-            dep_code = self.load_component_code(dep_id)
+            dep_code = self.load_component_code(dep_id, dependency_spans.get(dep_id))
             if dep_code:
                 dependency_sources[dep_id] = dep_code
 
@@ -42,21 +46,15 @@ class Searcher:
     
     def find_usage_references(self, component_id):
         filepath, component_name = component_id.split(':', 1)
-        pattern = re.compile(rf'\b{re.escape(component_name)}\b')
-        usage_refs = []
+        component_name = component_name.split(':', 1)[0]
+        if self.usage_index is None:
+            self.usage_index = UsageIndex(self.source_dir).build()
 
-        for root, _, files in os.walk(self.source_dir):
-            for file in files:
-                if file.endswith('.py'):
-                    full_path = os.path.join(root, file)
-                    with open(full_path, 'r', encoding='utf-8') as f:
-                        lines = f.readlines()
-                    
-                    for lineno, line in enumerate(lines, start=1):
-                        if pattern.search(line):
-                            usage_refs.append({
-                                'file': full_path,
-                                'line': lineno,
-                                'code': line.strip()
-                            })
-        return usage_refs
\ No newline at end of file
+        usage_refs = []
+        for full_path, lineno in self.usage_index.lookup(component_name, self.max_usage_refs):
+            usage_refs.append({
+                'file': full_path,
+                'line': lineno,
+                'code': self.source_store.line(full_path, lineno).strip()
+            })
+        return usage_refs
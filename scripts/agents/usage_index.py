@@ -0,0 +1,125 @@
+import io
+import json
+import keyword
+import os
+import re
+import tokenize
+from collections import defaultdict
+
+
+INDEX_VERSION = 1
+IDENTIFIER_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+
+def iter_identifiers(source):
+    """Yield (identifier, line number) for every name token in the source."""
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(source).readline):
+            if token.type == tokenize.NAME and not keyword.iskeyword(token.string):
+                yield token.string, token.start[0]
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        # Fall back to a plain scan for files the tokenizer cannot handle
+        for lineno, line in enumerate(source.splitlines(), start=1):
+            for match in IDENTIFIER_PATTERN.finditer(line):
+                if not keyword.iskeyword(match.group()):
+                    yield match.group(), lineno
+
+
+class UsageIndex:
+    """
+    Inverted index from identifier to the files and lines where it appears.
+    Each file is tokenized once; lookups are dictionary hits.
+    """
+
+    def __init__(self, source_dir):
+        self.source_dir = source_dir
+        self.postings = defaultdict(dict)  # identifier -> {filepath: [line numbers]}
+        self.file_identifiers = {}  # filepath -> identifiers it contributed, for removal
+        self.file_stats = {}  # filepath -> [mtime_ns, size]
+
+    def source_files(self):
+        for root, _, files in os.walk(self.source_dir):
+            for file in files:
+                if file.endswith('.py'):
+                    yield os.path.join(root, file)
+
+    def build(self):
+        for filepath in self.source_files():
+            self.index_file(filepath)
+        return self
+
+    def update(self):
+        """Re-index files that changed since they were indexed and drop deleted ones."""
+        seen = set()
+        updated = 0
+        for filepath in self.source_files():
+            seen.add(filepath)
+            stat = os.stat(filepath)
+            if self.file_stats.get(filepath) != [stat.st_mtime_ns, stat.st_size]:
+                self.index_file(filepath)
+                updated += 1
+        for filepath in set(self.file_stats) - seen:
+            self.remove_file(filepath)
+            updated += 1
+        return updated
+
+    def index_file(self, filepath):
+        self.remove_file(filepath)
+        stat = os.stat(filepath)
+        with open(filepath, 'r', encoding='utf-8') as f:
+            source = f.read()
+        file_postings = defaultdict(list)
+        for identifier, lineno in iter_identifiers(source):
+            lines = file_postings[identifier]
+            if not lines or lines[-1] != lineno:
+                lines.append(lineno)
+        for identifier, lines in file_postings.items():
+            self.postings[identifier][filepath] = lines
+        self.file_identifiers[filepath] = list(file_postings)
+        self.file_stats[filepath] = [stat.st_mtime_ns, stat.st_size]
+
+    def remove_file(self, filepath):
+        for identifier in self.file_identifiers.pop(filepath, ()):
+            files = self.postings.get(identifier)
+            if files is not None:
+                files.pop(filepath, None)
+                if not files:
+                    del self.postings[identifier]
+        self.file_stats.pop(filepath, None)
+
+    def lookup(self, identifier, limit=None):
+        """Return up to limit (filepath, line number) pairs where identifier occurs."""
+        refs = []
+        for filepath in sorted(self.postings.get(identifier, {})):
+            for lineno in self.postings[identifier][filepath]:
+                if limit is not None and len(refs) >= limit:
+                    return refs
+                refs.append((filepath, lineno))
+        return refs
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': INDEX_VERSION,
+                'source_dir': self.source_dir,
+                'file_stats': self.file_stats,
+                'file_identifiers': self.file_identifiers,
+                'postings': self.postings,
+            }, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, source_dir, path):
+        """Load a stored index and bring it up to date, or build a fresh one."""
+        index = cls(source_dir)
+        if os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION and data.get('source_dir') == source_dir:
+                index.file_stats = data['file_stats']
+                index.file_identifiers = data['file_identifiers']
+                index.postings = defaultdict(dict, data['postings'])
+        index.update()
+        return index
@@ -1,59 +1,214 @@
+import ast
+import hashlib
+import re
+import textwrap
+
+from .prompt_builder import component_nodes, parse_component
+from .writer import clean_docstring
+
+
+SECTION_PATTERN = re.compile(r'^\s*(Args|Arguments|Parameters|Params|Returns|Return|Yields|Raises|Attributes|'
+                             r'Methods|Examples?|Notes?|Warnings?|Todo)\s*:\s*$')
+ENTRY_PATTERN = re.compile(r'^\s*(\*{0,2}[A-Za-z_][\w.]*)\s*(\(([^)]*)\))?\s*:')
+SECTION_ALIASES = {'Arguments': 'Args', 'Parameters': 'Args', 'Params': 'Args', 'Return': 'Returns',
+                   'Yields': 'Returns', 'Example': 'Examples', 'Note': 'Notes', 'Warning': 'Warnings'}
+PLACEHOLDER_TEXT = "Placeholder docstring"
+REVIEW_PROMPT = """Review this Python docstring for correctness and completeness.
+Answer PASS if it accurately describes the code, otherwise FAIL followed by the problems.
+
+Source Code:
+{source_code}
+
+Docstring:
+{docstring}
+
+Verdict:"""
+
+
+def parse_google_docstring(docstring):
+    """
+    Split a Google-style docstring into its summary and sections.
+
+    Returns:
+        dict: 'summary', 'sections' (names present), 'args' {name: type text},
+            'returns' (section text), 'raises' (exception names) and 'attributes' (names).
+    """
+    parsed = {'summary': '', 'sections': set(), 'args': {}, 'returns': '', 'raises': set(), 'attributes': set()}
+    section = None
+    for line in docstring.splitlines():
+        header = SECTION_PATTERN.match(line)
+        if header:
+            section = SECTION_ALIASES.get(header.group(1), header.group(1))
+            parsed['sections'].add(section)
+            continue
+        if section is None:
+            if line.strip() and not parsed['summary']:
+                parsed['summary'] = line.strip()
+            continue
+        entry = ENTRY_PATTERN.match(line)
+        if section == 'Args' and entry:
+            parsed['args'][entry.group(1).lstrip('*')] = entry.group(3) or ''
+        elif section == 'Raises' and entry:
+            parsed['raises'].add(entry.group(1).rsplit('.', 1)[-1])
+        elif section == 'Attributes' and entry:
+            parsed['attributes'].add(entry.group(1))
+        elif section == 'Returns':
+            parsed['returns'] += line.strip() + '\n'
+    return parsed
+
+
+def signature_facts(source_code, tree=None, nodes=None):
+    """
+    Parameters, defaults, return annotation and raised exceptions of one function
+    or class, or None when the source does not parse.
+    tree, nodes: the already parsed module of source_code and the nodes of its
+        definition, see parse_component and component_nodes.
+    """
+    try:
+        node = (tree or ast.parse(textwrap.dedent(source_code or ''))).body[0]
+    except (SyntaxError, IndexError):
+        return None
+    facts = {'kind': 'class' if isinstance(node, ast.ClassDef) else 'function',
+             'params': [], 'defaults': set(), 'returns_value': False, 'return_annotation': None,
+             'raises': set(), 'attributes': set()}
+    if isinstance(node, ast.ClassDef):
+        for sub in nodes or ast.walk(node):
+            if isinstance(sub, ast.Attribute) and isinstance(sub.ctx, ast.Store):
+                facts['attributes'].add(sub.attr)
+        return facts
+    if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return None
+
+    args = node.args
+    positional = args.posonlyargs + args.args
+    for arg in positional + args.kwonlyargs:
+        if arg.arg not in ('self', 'cls'):
+            facts['params'].append(arg.arg)
+    facts['defaults'].update(arg.arg for arg in positional[len(positional) - len(args.defaults):])
+    facts['defaults'].update(arg.arg for arg, default in zip(args.kwonlyargs, args.kw_defaults) if default is not None)
+    for arg in (args.vararg, args.kwarg):
+        if arg is not None:
+            facts['params'].append(arg.arg)
+            facts['defaults'].add(arg.arg)
+
+    if node.returns is not None:
+        facts['return_annotation'] = ast.unparse(node.returns)
+    for sub in nodes or ast.walk(node):
+        if isinstance(sub, (ast.Return, ast.Yield, ast.YieldFrom)) and sub.value is not None:
+            facts['returns_value'] = True
+        elif isinstance(sub, ast.Raise) and sub.exc is not None:
+            exc = sub.exc.func if isinstance(sub.exc, ast.Call) else sub.exc
+            if isinstance(exc, ast.Name):
+                facts['raises'].add(exc.id)
+            elif isinstance(exc, ast.Attribute):
+                facts['raises'].add(exc.attr)
+    if facts['return_annotation'] == 'None':
+        facts['returns_value'] = False
+    elif facts['return_annotation'] is not None:
+        facts['returns_value'] = True
+    return facts
+
+
 class Verifier:
-    def __init__(self, llm_client=None):
+    """
+    Two-tier docstring check. Every docstring gets a static check of the component's
+    AST against its Google-style sections. Only low-confidence results, plus a
+    sampled share of the rest, are sent to the LLM, in one batched review.
+    """
+
+    def __init__(self, llm_client=None, review_rate=0.0, review_threshold=0.5):
         self.llm_client = llm_client
-    
-    def verify_docstring(self, context):
-        component_id = context['component_id']
-        docstring = context.get('docstring', '')
-        source_code = context.get('source_code', '')
-        dependencies = context.get('dependency_sources', {})
-        external_refs = context.get('external_refs', [])
-        usage_refs = context.get('usage_refs', [])
+        self.review_rate = review_rate
+        self.review_threshold = review_threshold
 
-        report  = {
+    def static_check(self, context):
+        component_id = context['component_id']
+        docstring = clean_docstring(context.get('docstring', '') or '')
+        report = {
             'component': component_id,
             'status': "PASS",
-            'issues': []
+            'issues': [],
+            'confidence': 1.0,
         }
 
-        if not docstring or len(docstring.strip()) == 0:
-            report['status'] = "FAIL"
-            report['issues'].append("Docstring is missing or empty.")
+        def issue(status, message):
+            if status == "FAIL" or report['status'] == "PASS":
+                report['status'] = status
+            report['issues'].append(message)
 
-        if 'TODO' in docstring or 'FIXME' in docstring:
-            report['status'] = "WARNING"
-            report['issues'].append("Docstring contains TODO or FIXME comments.")
-        
-        if '(' in source_code and ')' not in source_code:
-            param_str = source_code.split('(')[1].split(')')[0]
-            params = [p.strip() for p in param_str.split(',') if p.strip() and p != 'self']
-            for param in params:
-                if param not in docstring:
-                    report['status'] = "WARNING"
-                    report['issues'].append(f"Missing parameter descrpition: {param}")
+        if not docstring:
+            issue("FAIL", "Docstring is missing or empty.")
+        elif docstring.startswith(PLACEHOLDER_TEXT):
+            issue("FAIL", "Docstring is a placeholder.")
+        else:
+            if 'TODO' in docstring or 'FIXME' in docstring:
+                issue("WARNING", "Docstring contains TODO or FIXME comments.")
+            facts = signature_facts(context.get('source_code', ''), parse_component(context),
+                                    component_nodes(context))
+            if facts is not None:
+                self.check_against_signature(parse_google_docstring(docstring), facts, issue)
 
-        
-        if self.llm_client:
-            prompt = f"""Review this Python docstring for correctness and completeness.
+        report['confidence'] = 0.0 if report['status'] == "FAIL" else max(0.0, 1.0 - 0.25 * len(report['issues']))
+        return report
 
-            Source Code:
-            {source_code}
+    def check_against_signature(self, parsed, facts, issue):
+        if facts['kind'] == 'class':
+            for name in sorted(parsed['attributes'] - facts['attributes']):
+                issue("WARNING", f"Documented attribute not assigned in the class: {name}")
+            return
 
-            Dependencies:
-            {dependencies}
+        for name in parsed['args']:
+            if name not in facts['params']:
+                issue("FAIL", f"Documented parameter not in the signature: {name}")
+        for name in facts['params']:
+            if name not in parsed['args']:
+                issue("WARNING", f"Missing parameter description: {name}")
+            elif 'optional' in parsed['args'][name] and name not in facts['defaults']:
+                issue("WARNING", f"Parameter documented as optional but has no default: {name}")
 
-            Usage:
-            {usage_refs}
+        if facts['returns_value'] and 'Returns' not in parsed['sections']:
+            issue("WARNING", "Missing Returns section.")
+        elif not facts['returns_value'] and parsed['returns'].strip() and facts['return_annotation'] is not None:
+            issue("WARNING", "Returns section documented but the function returns None.")
+        annotation = facts['return_annotation']
+        documented_type = parsed['returns'].split(':', 1)[0].strip() if ':' in parsed['returns'] else ''
+        if annotation and documented_type.isidentifier() and annotation.isidentifier() and documented_type != annotation:
+            issue("WARNING", f"Returns type {documented_type} does not match annotation {annotation}.")
 
-            External References:
-            {external_refs}
+        for name in sorted(facts['raises'] - parsed['raises']):
+            issue("WARNING", f"Raised exception not documented: {name}")
+        for name in sorted(parsed['raises'] - facts['raises']):
+            issue("WARNING", f"Documented exception not raised directly: {name}")
 
-            Docstring:
-            {docstring}
+    def sampled(self, component_id):
+        """Deterministic spot-check selection, so reruns review the same components."""
+        digest = hashlib.sha1(component_id.encode('utf-8')).hexdigest()[:8]
+        return int(digest, 16) / 0xFFFFFFFF < self.review_rate
 
-            Provide a review summary with issues if any.
-            """
-            llm_response = self.llm_client.review_docstring(prompt)
-            report['llm_review'] = llm_response
+    def needs_review(self, report):
+        if self.llm_client is None or report['status'] == "FAIL":
+            # Clear static failures are regenerated directly; a review cannot rescue them
+            return False
+        return report['confidence'] < self.review_threshold or self.sampled(report['component'])
 
-        return report
\ No newline at end of file
+    def verify_batch(self, contexts):
+        """
+        Statically check every context and review the suspicious ones in one LLM call.
+        Cached docstrings were verified before they were stored and are never reviewed again.
+        """
+        reports = [self.static_check(context) for context in contexts]
+        escalated = [i for i, report in enumerate(reports)
+                     if not contexts[i].get('cached') and self.needs_review(report)]
+        if escalated:
+            prompts = [REVIEW_PROMPT.format(source_code=contexts[i].get('source_code', ''),
+                                            docstring=clean_docstring(contexts[i].get('docstring', '')))
+                       for i in escalated]
+            for i, review in zip(escalated, self.llm_client.review_docstrings(prompts)):
+                reports[i]['llm_review'] = review
+                if review.strip().upper().startswith('FAIL'):
+                    reports[i]['status'] = "FAIL"
+                    reports[i]['issues'].append("LLM review failed the docstring.")
+        return reports
+
+    def verify_docstring(self, context):
+        return self.verify_batch([context])[0]
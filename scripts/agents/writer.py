@@ -1,120 +1,280 @@
+import ast
 import os
-import re
+import textwrap
+import threading
+from utils import SourceStore, output_path
+from tracing import NULL_TRACER
+from .prompt_builder import PromptBuilder, FEW_SHOT_PREFIX, component_nodes, docstring_token_limit, parse_component
+from .dedup import adapt_docstring, fingerprint
+
+
+DEFINITION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+QUOTES = ('"""', "'''")
+STATEMENT_FIELDS = ('body', 'orelse', 'finalbody')
+
+
+def clean_docstring(text):
+    """Strip surrounding quotes and anything the model generated after the closing quotes."""
+    text = (text or '').strip()
+    for quote in QUOTES:
+        if text.startswith(quote):
+            text = text[len(quote):]
+            end = text.find(quote)
+            if end != -1:
+                text = text[:end]
+            break
+    return textwrap.dedent(text.strip('\n')).strip()
+
+
+def iter_definitions(tree):
+    """Yield every function and class node, following statement bodies only."""
+    stack = list(tree.body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, DEFINITION_NODES):
+            yield node
+        for field in STATEMENT_FIELDS:
+            stack.extend(getattr(node, field, ()))
+        for handler in getattr(node, 'handlers', ()):
+            stack.extend(handler.body)
+        for case in getattr(node, 'cases', ()):
+            stack.extend(case.body)
+
+
+def format_docstring(text, indent):
+    """Lines of a triple-quoted docstring block at the given indentation."""
+    text = clean_docstring(text).replace('\\', '\\\\').replace('"""', '\\"\\"\\"')
+    body = [f"{indent}{line}" if line.strip() else '' for line in text.splitlines()]
+    return [f'{indent}"""'] + body + [f'{indent}"""']
+
 
 class Writer:
-    def __init__(self, source_dir, output_dir, llm_client=None):
+    def __init__(self, source_dir, output_dir, llm_client=None, cache=None, source_store=None,
+                 prompt_token_budget=1792, tracer=None, dedup=True, dedup_rename=False):
         self.source_dir = source_dir
         self.output_dir = output_dir
         self.llm_client = llm_client
+        self.cache = cache
+        self.source_store = source_store if source_store is not None else SourceStore()
+        self.tracer = tracer or NULL_TRACER
+        self.dedup = dedup
+        self.dedup_rename = dedup_rename
+        self.dedup_saved = 0
+        self.prompt_totals = {'prompts': 0, 'tokens_used': 0, 'tokens_dropped': 0, 'truncated': 0}
+        self._prompt_lock = threading.Lock()
+        self._dedup_results = {}  # fingerprint -> (verified docstring, identifiers of the component it was generated for)
+        self._dedup_lock = threading.Lock()
+        count_tokens = llm_client.count_tokens if llm_client else None
+        self.prompt_builder = PromptBuilder(count_tokens, prompt_token_budget)
+        # Every prompt starts with the few-shot examples; let the client precompute them once
+        if llm_client:
+            llm_client.set_prompt_prefix(FEW_SHOT_PREFIX)
 
-    def generate_docstring(self, context):
-        source_code = context.get('source_code', '')
-        dependencies = context.get('dependency_sources', {})
-        external_refs = context.get('external_refs', [])
-        usage_refs = context.get('usage_refs', [])
-
-        prompt = (
-            "Generate a Python docstring for the following code. "
-            "The docstring should summarize the component in one line, list input parameters with types and descriptions, and describe the return value. "
-            "Use Google-style docstrings.\n\n"
-            "Code:\n"
-            "def add_numbers(a: float, b: float) -> float:\n"
-            "    return a + b\n"
-            "Docstring:\n"
-            '"""\n'
-            "Add two numbers and return the result.\n\n"
-            "Args:\n"
-            "    a (float): The first number.\n"
-            "    b (float): The second number.\n\n"
-            "Returns:\n"
-            "    float: The sum of the two input numbers.\n"
-            '"""\n\n'
-            "Code:\n"
-            "class Person:\n"
-            "    def __init__(self, name: str, age: int):\n"
-            "        self.name = name\n"
-            "        self.age = age\n\n"
-            "    def greet(self) -> str:\n"
-            "        return f'Hello, my name is ' _ self.name\n"
-            "Docstring:\n"
-            '"""\n'
-            "Represents a person with a name and age.\n\n"
-            "Attributes:\n"
-            "    name (str): The name of the person.\n"
-            "    age (int): The age of the person.\n\n"
-            "Methods:\n"
-            "    greet(): Returns a greeting string.\n"
-            '"""\n\n'
-            "Source Code:\n{source_code}\n\n"
-            "Dependencies:\n{dependencies}\n\n"
-            "External references:\n{external_refs}\n\n"
-            "Usage references:\n{usage_refs}\n"
-            "Docstring:"
-        ).format(
-            source_code=source_code,
-            dependencies=dependencies,
-            external_refs=external_refs,
-            usage_refs=usage_refs
+    def build_prompt(self, context):
+        """Build the token-budgeted prompt once per context and keep it with its stats."""
+        if 'prompt' not in context:
+            with self.tracer.span('prompt', component=context.get('component_id')) as span:
+                context['prompt'], context['prompt_stats'] = self.prompt_builder.build(context)
+                stats = context['prompt_stats']
+                span.set(prompt_tokens=stats['tokens_used'], tokens_dropped=stats['tokens_dropped'])
+            with self._prompt_lock:
+                self.prompt_totals['prompts'] += 1
+                self.prompt_totals['tokens_used'] += stats['tokens_used']
+                self.prompt_totals['tokens_dropped'] += stats['tokens_dropped']
+                self.prompt_totals['truncated'] += stats['tokens_dropped'] > 0
+        return context['prompt']
+
+    def count_prompt_tokens(self, context):
+        self.build_prompt(context)
+        return context['prompt_stats']['tokens_used']
+
+    def cache_key(self, context):
+        if self.cache is None or not self.llm_client:
+            return None
+        return self.cache.make_key(
+            context.get('source_code', ''), context.get('dependency_sources', {}), self.prompt_builder.signature(),
+            self.llm_client,
+            context.get('dependency_docstrings')
         )
 
-        if self.llm_client:
-            docstring = self.llm_client.generate_docstring(prompt)
-        else:
-            docstring = "Placeholder docstring: describe the function or class"
-        return docstring
+    def generate_docstring(self, context):
+        return self.generate_docstrings([context])[0]
+
+    def generate_docstrings(self, contexts, regenerate=False):
+        """
+        Generate docstrings for several components at once.
+        Cached docstrings are reused, structurally identical components share one
+        generation, and the remaining prompts are sent to the LLM as one batch.
+        New docstrings are not cached here; see cache_verified.
+        regenerate: skip the cache and dedup results and add each context's failed
+            verification to its prompt, e.g. after a failed verification.
+        """
+        if not self.llm_client:
+            return ["Placeholder docstring: describe the function or class" for _ in contexts]
+
+        docstrings = [None] * len(contexts)
+        pending = []
+        with self.tracer.span('cache_lookup', components=len(contexts)) as span:
+            keys = [self.cache_key(context) for context in contexts]
+            for i, key in enumerate(keys):
+                if key is not None and not regenerate:
+                    docstrings[i] = self.cache.get(key)
+                # Cached docstrings passed verification before they were stored
+                contexts[i]['cached'] = docstrings[i] is not None
+                if docstrings[i] is None:
+                    pending.append(i)
+            span.set(cache_hits=len(contexts) - len(pending))
+
+        unique, groups = pending, {}
+        if pending and self.dedup and not regenerate:
+            with self.tracer.span('dedup', components=len(pending)) as span:
+                unique, groups = self.deduplicate(contexts, pending, docstrings)
+                span.set(saved_calls=len(pending) - len(unique))
+
+        if unique:
+            prompts = [self.build_prompt(contexts[i]) for i in unique]
+            if regenerate:
+                # The same prompt would reproduce the same docstring under greedy decoding
+                prompts = [self.prompt_builder.with_feedback(prompt, contexts[i].get('verification'))
+                           for prompt, i in zip(prompts, unique)]
+            # Size each generation to the component instead of always decoding the maximum
+            limits = [docstring_token_limit(contexts[i].get('source_code'), self.llm_client.max_new_tokens,
+                                            parse_component(contexts[i]), component_nodes(contexts[i]))
+                      for i in unique]
+            with self.tracer.span('generate', components=len(unique),
+                                  prompt_tokens=sum(contexts[i]['prompt_stats']['tokens_used'] for i in unique),
+                                  max_new_tokens=sum(limits),
+                                  component_ids=[contexts[i].get('component_id') for i in unique]) as span:
+                generated = self.llm_client.generate_docstrings(prompts, limits)
+                if self.tracer.enabled:
+                    span.set(output_tokens=sum(self.llm_client.count_tokens(text) for text in generated))
+            for i, docstring in zip(unique, generated):
+                docstrings[i] = docstring
+                if i in groups:
+                    _, names, members = groups[i]
+                    for member, member_names in members:
+                        docstrings[member] = adapt_docstring(docstring, names, member_names)
+
+        for context in contexts:
+            context.pop('cache_key', None)
+        for i in pending:
+            if keys[i] is not None:
+                contexts[i]['cache_key'] = keys[i]
+        return docstrings
+
+    def cache_verified(self, contexts):
+        """Cache the newly generated docstrings that passed verification and share them with later duplicates."""
+        for context in contexts:
+            key = context.pop('cache_key', None)
+            dedup_key = context.pop('dedup_key', None)
+            if context.get('verification', {}).get('status') == "FAIL":
+                continue
+            if key is not None:
+                self.cache.put(key, context['docstring'])
+            if dedup_key is not None:
+                digest, names = dedup_key
+                with self._dedup_lock:
+                    self._dedup_results.setdefault(digest, (context['docstring'], names))
+
+    def deduplicate(self, contexts, pending, docstrings):
+        """
+        Group pending components by normalized AST fingerprint. Components matching an
+        earlier verified generation get its docstring right away, with identifiers adapted.
+        Each fingerprint is kept on its context until cache_verified records the result.
+
+        Returns:
+            tuple: (indices still to generate, {representative index: (digest, names, [(member index, names)])})
+        """
+        unique, groups, representatives = [], {}, {}
+        for i in pending:
+            tree = parse_component(contexts[i])
+            if tree is None:
+                unique.append(i)
+                continue
+            digest, names = fingerprint(contexts[i].get('source_code'), self.dedup_rename, tree)
+            if digest is None:
+                unique.append(i)
+                continue
+            contexts[i]['dedup_key'] = (digest, names)
+            previous = self._dedup_results.get(digest)
+            if previous is not None:
+                docstrings[i] = adapt_docstring(previous[0], previous[1], names)
+            elif digest in representatives:
+                groups[representatives[digest]][2].append((i, names))
+            else:
+                representatives[digest] = i
+                groups[i] = (digest, names, [])
+                unique.append(i)
+        with self._dedup_lock:
+            self.dedup_saved += len(pending) - len(unique)
+        return unique, groups
 
     def insert_docstrings_bulk(self, original_code, components):
         """
-        Insert docstrings for all components (functions/classes) in the file.
-        components: list of dicts with 'name', 'type', and 'docstring'.
+        Insert docstrings for all components (functions/classes) in the file in one pass.
+        components: list of dicts with 'name', 'type', 'docstring' and, when known,
+            'lineno' of the def/class line, which picks the target even when names repeat.
+        Components that already have a docstring are left unchanged.
         """
+        try:
+            tree = ast.parse(original_code)
+        except SyntaxError as error:
+            print(f"Cannot parse file for docstring insertion, leaving it unchanged: {error}")
+            return original_code
+
+        by_line, by_name = {}, {}
+        for node in sorted(iter_definitions(tree), key=lambda node: node.lineno):
+            by_line[node.lineno] = node
+            by_name.setdefault(node.name, []).append(node)
+
         lines = original_code.split('\n')
-        insertions = []
+        insertions = {}
+        # Nodes already matched to a component, so repeated names fall through to the next definition
+        used = set()
         for comp in components:
-            # Use a robust regex pattern with f-string and raw string
-            pattern = re.compile(rf"^(\s*)(def|class)\s+{re.escape(comp['name'])}\b.*:")
-            found = False
-            for i, line in enumerate(lines):
-                match = pattern.match(line)
-                if match:
-                    found = True
-                    # Check if next non-empty, non-comment line is a docstring
-                    j = i + 1
-                    while j < len(lines) and (lines[j].strip() == '' or lines[j].strip().startswith('#')):
-                        j += 1
-                    if j < len(lines) and (lines[j].strip().startswith('"""') or lines[j].strip().startswith("'''")):
-                        # Existing docstring found, skip
-                        break
-                    indent = match.group(1) + ' ' * 4
-                    docstring_lines = [f'{indent}"""', f'{indent}{comp["docstring"]}', f'{indent}"""']
-                    insertions.append((i + 1, docstring_lines))
-                    break
-            if not found:
+            node = by_line.get(comp.get('lineno'))
+            if node is None or node.name != comp['name'] or id(node) in used:
+                candidates = by_name.get(comp['name'], [])
+                node = next((n for n in candidates if id(n) not in used), None)
+            if node is None:
                 print(f"[DEBUG] No match found for component: {comp['name']}")
-        # Insert docstrings from bottom to top to avoid messing up indices
-        for idx, docstring_lines in sorted(insertions, reverse=True):
-            lines[idx:idx] = docstring_lines
-        return '\n'.join(lines)
+                continue
+            used.add(id(node))
+            if ast.get_docstring(node, clean=False) is not None:
+                continue
+            first = node.body[0]
+            first_line = min([first.lineno] + [d.lineno for d in getattr(first, 'decorator_list', [])])
+            if first_line == node.lineno or first_line - 1 >= len(lines):
+                print(f"[DEBUG] Body of {comp['name']} shares its header line, skipping")
+                continue
+            body_line = lines[first_line - 1]
+            indent = body_line[:len(body_line) - len(body_line.lstrip())]
+            insertions[first_line - 1] = format_docstring(comp['docstring'], indent)
+
+        if not insertions:
+            return original_code
+        output = []
+        for i, line in enumerate(lines):
+            block = insertions.get(i)
+            if block is not None:
+                output.extend(block)
+            output.append(line)
+        return '\n'.join(output)
 
     def write_docstrings_for_file(self, filepath, components_contexts):
         """
         For a given file, insert docstrings for all components (using pre-generated docstrings), and write the updated code to output_dir.
-        components_contexts: list of context dicts for each component in the file.
+        components_contexts: list of dicts with 'name', 'type', 'lineno' and 'docstring' for each component
+            in the file; components without a docstring are left unchanged.
         """
         # Always use the full path to the source file
-        full_path = filepath
-        with open(full_path, 'r', encoding='utf-8') as file:
-            original_code = file.read()
-        # Use pre-generated docstrings for all components
-        components = []
-        for context in components_contexts:
-            docstring = context.get('docstring')
-            if not docstring:
-                docstring = self.generate_docstring(context)
-            components.append({'name': context['name'], 'type': context['type'], 'docstring': docstring})
+        original_code = self.source_store.text(filepath)
+        components = [{'name': context['name'], 'type': context['type'], 'lineno': context.get('lineno'),
+                       'docstring': context['docstring']}
+                      for context in components_contexts if context.get('docstring')]
         updated_code = self.insert_docstrings_bulk(original_code, components)
-        output_path = os.path.join(self.output_dir, filepath)
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, 'w', encoding='utf-8') as file:
+        path = output_path(self.output_dir, filepath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
             file.write(updated_code)
-        print(f"Wrote docstrings for {filepath} to {output_path}")
\ No newline at end of file
+        print(f"Wrote docstrings for {filepath} to {path}")
\ No newline at end of file
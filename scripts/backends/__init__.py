@@ -0,0 +1,17 @@
+from .base import LLMBackend
+
+BACKENDS = ('local', 'http')
+
+
+def create_backend(kind='local', **options):
+    """
+    Build the LLM backend named by kind. Imports are deferred so the HTTP
+    backend does not pull in torch and transformers.
+    """
+    if kind == 'local':
+        from .local import LocalLLMClient
+        return LocalLLMClient(**options)
+    if kind == 'http':
+        from .remote import AsyncHTTPBackend
+        return AsyncHTTPBackend(**options)
+    raise ValueError(f"Unknown backend {kind!r}, expected one of {BACKENDS}")
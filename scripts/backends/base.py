@@ -0,0 +1,65 @@
+# Generation ends at the closing quotes of the docstring or when the model starts another example
+STOP_STRINGS = ('"""', 'Code:')
+
+
+def truncate_at_stop(text, stop_strings=STOP_STRINGS):
+    """Cut text at the first stop string."""
+    positions = [text.find(stop) for stop in stop_strings]
+    positions = [position for position in positions if position != -1]
+    return text[:min(positions)] if positions else text
+
+
+def per_prompt(value, default, count):
+    """Expand an int-or-list generation setting into one value per prompt."""
+    if value is None:
+        value = default
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value] * count
+
+
+class LLMBackend:
+    """
+    Interface the Writer and Verifier use to talk to a language model.
+    Subclasses implement generate_docstrings; the other methods have usable defaults.
+    """
+
+    model_name = None
+    max_new_tokens = 200
+
+    def signature(self):
+        """Describe the model and generation settings, used in docstring cache keys."""
+        return {'backend': type(self).__name__, 'model': self.model_name}
+
+    def count_tokens(self, text):
+        # Rough estimate for backends without a local tokenizer
+        return len(text) // 4
+
+    def set_prompt_prefix(self, prefix):
+        """Hint that every prompt starts with prefix. Backends may precompute it."""
+
+    def generate_docstring(self, prompt, max_new_tokens=None, temperature=None):
+        return self.generate_docstrings([prompt], max_new_tokens, temperature)[0]
+
+    def generate_docstrings(self, prompts, max_new_tokens=None, temperature=None):
+        """
+        max_new_tokens: a single limit or one limit per prompt.
+        Returns the generated text after each prompt, cut at the first stop string.
+        """
+        raise NotImplementedError
+
+    def review_docstring(self, prompt):
+        return self.review_docstrings([prompt])[0]
+
+    def review_docstrings(self, prompts):
+        return self.generate_docstrings(prompts)
+
+    def reset_stats(self):
+        """Start counting backend statistics for a new run."""
+
+    def stats_summary(self):
+        """A line of backend statistics for the run so far, or None if there are none."""
+        return None
+
+    def close(self):
+        pass
@@ -0,0 +1,316 @@
+import copy
+import threading
+import time
+
+from transformers import AutoModelForCausalLM, AutoTokenizer, DynamicCache, StoppingCriteria, StoppingCriteriaList
+import torch
+
+from .base import STOP_STRINGS, LLMBackend, per_prompt, truncate_at_stop
+
+
+class StopOnStrings(StoppingCriteria):
+    """
+    Finish each row of a batch once its new tokens contain a stop string or reach
+    that row's token limit; generation ends when every row is finished.
+    """
+
+    def __init__(self, tokenizer, lock, prompt_width, limits, stop_strings=STOP_STRINGS, window=8):
+        self.tokenizer = tokenizer
+        self.lock = lock
+        self.prompt_width = prompt_width
+        self.limits = limits
+        self.stop_strings = stop_strings
+        self.window = window
+        self.done = [False] * len(limits)
+
+    def __call__(self, input_ids, scores, **kwargs):
+        generated = input_ids.shape[1] - self.prompt_width
+        for row, limit in enumerate(self.limits):
+            if self.done[row]:
+                continue
+            if generated >= limit:
+                self.done[row] = True
+                continue
+            # Stop strings are a few characters, so the last few tokens are enough to find them
+            with self.lock:
+                tail = self.tokenizer.decode(input_ids[row, -min(self.window, generated):], skip_special_tokens=True)
+            self.done[row] = any(stop in tail for stop in self.stop_strings)
+        return torch.tensor(self.done, dtype=torch.bool, device=input_ids.device)
+
+
+def configure_threads(num_threads=None, num_interop_threads=None):
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError:
+            # Only allowed once, before any inter-op parallel work has started
+            print("Inter-op thread count was already fixed for this process; keeping it")
+    print(f"Torch threads: {torch.get_num_threads()} intra-op, {torch.get_num_interop_threads()} inter-op")
+
+
+class PromptLookup:
+    """
+    Drafts continuations by finding the latest n-gram of the output in the prompt
+    tokens and proposing the tokens that followed it there. Docstrings repeat
+    parameter names, types and identifiers from the source, so these drafts are
+    often right.
+    """
+
+    def __init__(self, prompt_ids, ngram_size=3):
+        self.prompt_ids = prompt_ids
+        self.ngram_size = ngram_size
+        # n-gram -> index just past its latest occurrence that still has a continuation
+        self.index = {}
+        for n in range(1, ngram_size + 1):
+            for start in range(len(prompt_ids) - n):
+                self.index[tuple(prompt_ids[start:start + n])] = start + n
+
+    def propose(self, tail, count):
+        for n in range(min(self.ngram_size, len(tail)), 0, -1):
+            end = self.index.get(tuple(tail[-n:]))
+            if end is not None:
+                return self.prompt_ids[end:end + count]
+        return []
+
+
+class SpeculationStats:
+    """Counters for prompt-lookup decoding over one run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.tokens = 0
+        self.forward_passes = 0
+        self.drafted = 0
+        self.accepted = 0
+        self.seconds = 0.0
+
+    def record(self, tokens, forward_passes, drafted, accepted, seconds):
+        with self.lock:
+            self.tokens += tokens
+            self.forward_passes += forward_passes
+            self.drafted += drafted
+            self.accepted += accepted
+            self.seconds += seconds
+
+    def summary(self):
+        if not self.forward_passes:
+            return None
+        acceptance = self.accepted / self.drafted if self.drafted else 0.0
+        rate = self.tokens / self.seconds if self.seconds else 0.0
+        # Each forward pass would produce one token without drafts, so this is the decode step speedup
+        return (f"Speculative decoding: {self.tokens} tokens in {self.forward_passes} forward passes "
+                f"({self.tokens / self.forward_passes:.2f}x fewer decode steps), "
+                f"{acceptance:.1%} of {self.drafted} drafted tokens accepted, {rate:.1f} tok/s")
+
+
+class LocalLLMClient(LLMBackend):
+    """
+    Runs a Hugging Face causal LM in-process.
+    quantize: convert Linear layers to dynamic int8 (CPU only); weights shrink about 4x
+        and matrix multiplies use int8 kernels.
+    num_threads / num_interop_threads: torch intra-op and inter-op thread pools; by
+        default torch uses every core, which oversubscribes when several clients or
+        worker processes share a machine.
+    temperature: 0 decodes greedily.
+    speculative: decode each prompt greedily with prompt-lookup drafts of up to draft_tokens
+        tokens, matched on n-grams of up to ngram_size tokens. The model checks a whole draft
+        in one forward pass and the output is the same as plain greedy decoding. Implies
+        temperature 0; prompts are decoded one at a time instead of in padded batches.
+    """
+
+    def __init__(self, model_name='TinyLlama/TinyLlama-1.1B-Chat-v1.0', device='cpu', quantize=False,
+                 num_threads=None, num_interop_threads=None, temperature=0.7, speculative=False,
+                 draft_tokens=8, ngram_size=3):
+        configure_threads(num_threads, num_interop_threads)
+        print(f"Loading model {model_name} on {device}{' with int8 dynamic quantization' if quantize else ''}...")
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        # Decoder-only models continue from the last token, so pad batches on the left
+        self.tokenizer.padding_side = 'left'
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = AutoModelForCausalLM.from_pretrained(model_name).to(device)
+        self.model.eval()
+        if quantize:
+            if device != 'cpu':
+                raise ValueError("Dynamic int8 quantization is only supported on CPU")
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model_name = model_name
+        self.device = device
+        self.quantize = quantize
+        # Fast tokenizers are not safe to call from several worker threads at once
+        self._tokenizer_lock = threading.Lock()
+        self.max_new_tokens = 200
+        if speculative and temperature > 0:
+            print("Speculative decoding verifies drafts greedily; using temperature 0")
+            temperature = 0
+        self.temperature = temperature
+        self.speculative = speculative
+        self.draft_tokens = draft_tokens
+        self.ngram_size = ngram_size
+        self.speculation = SpeculationStats()
+        self.prefix = None
+        self.prefix_ids = None
+        self.prefix_cache = None
+
+    def signature(self):
+        signature = {
+            'model': self.model_name,
+            'max_new_tokens': self.max_new_tokens,
+            'temperature': self.temperature,
+            'do_sample': self.temperature > 0,
+        }
+        if self.quantize:
+            signature['quantize'] = 'int8-dynamic'
+        return signature
+
+    def set_prompt_prefix(self, prefix):
+        """
+        Precompute the KV cache for a prefix shared by every prompt, such as the
+        few-shot examples, so generation only has to prefill the rest of each prompt.
+        """
+        if prefix == self.prefix:
+            return
+        with self._tokenizer_lock:
+            prefix_ids = self.tokenizer(prefix)['input_ids']
+        cache = DynamicCache()
+        with torch.no_grad():
+            self.model(input_ids=torch.tensor([prefix_ids], device=self.device), past_key_values=cache, use_cache=True)
+        self.prefix, self.prefix_ids, self.prefix_cache = prefix, prefix_ids, cache
+        print(f"Cached KV for a {len(prefix_ids)}-token prompt prefix")
+
+    def count_tokens(self, text):
+        with self._tokenizer_lock:
+            return len(self.tokenizer(text)['input_ids'])
+
+    def generate_docstrings(self, prompts, max_new_tokens=None, temperature=None, batch_size=16):
+        """
+        Generate docstrings for several prompts.
+        Prompts are sorted by token length and padded in buckets of batch_size so that
+        each batch wastes as little compute on padding as possible. Prompts that start
+        with the cached prefix only prefill the tokens after it. Each row stops at a stop
+        string or its own entry of max_new_tokens, whichever comes first. In speculative
+        mode greedy prompts are decoded one by one with prompt-lookup drafts instead.
+        """
+        limits = per_prompt(max_new_tokens, self.max_new_tokens, len(prompts))
+        if temperature is None:
+            temperature = self.temperature
+        with self._tokenizer_lock:
+            encoded = self.tokenizer(prompts)['input_ids']
+
+        # Split off the cached prefix where the prompt's tokens really begin with it
+        prefix_len = len(self.prefix_ids) if self.prefix_cache is not None else 0
+        suffixes = {}
+        for i, ids in enumerate(encoded):
+            if prefix_len and len(ids) > prefix_len and ids[:prefix_len] == self.prefix_ids:
+                suffixes[i] = ids[prefix_len:]
+
+        results = [None] * len(prompts)
+        for use_prefix in (True, False):
+            indices = [i for i in range(len(prompts)) if (i in suffixes) == use_prefix]
+            rows = {i: suffixes[i] if use_prefix else encoded[i] for i in indices}
+            if self.speculative and temperature == 0:
+                for i in indices:
+                    results[i] = truncate_at_stop(self._generate_speculative(rows[i], use_prefix, limits[i])).strip()
+                continue
+            order = sorted(indices, key=lambda i: len(rows[i]))
+            for start in range(0, len(order), batch_size):
+                bucket = order[start:start + batch_size]
+                texts = self._generate_bucket([rows[i] for i in bucket], use_prefix,
+                                              [limits[i] for i in bucket], temperature)
+                for i, text in zip(bucket, texts):
+                    results[i] = truncate_at_stop(text).strip()
+        return results
+
+    def _generate_bucket(self, rows, use_prefix, limits, temperature):
+        """
+        Run one padded batch. With use_prefix, rows are prompt suffixes and the padding
+        sits between the cached prefix and each suffix, masked out of attention.
+        """
+        pad_id = self.tokenizer.pad_token_id
+        width = max(len(row) for row in rows)
+        prefix_ids = self.prefix_ids if use_prefix else []
+        input_ids = [prefix_ids + [pad_id] * (width - len(row)) + row for row in rows]
+        attention_mask = [[1] * len(prefix_ids) + [0] * (width - len(row)) + [1] * len(row) for row in rows]
+        generate_kwargs = {'do_sample': temperature > 0}
+        if temperature > 0:
+            generate_kwargs['temperature'] = temperature
+        if use_prefix:
+            cache = copy.deepcopy(self.prefix_cache)
+            if len(rows) > 1:
+                cache.batch_repeat_interleave(len(rows))
+            generate_kwargs['past_key_values'] = cache
+
+        with torch.no_grad():
+            output = self.model.generate(
+                input_ids=torch.tensor(input_ids, device=self.device),
+                attention_mask=torch.tensor(attention_mask, device=self.device),
+                max_new_tokens=max(limits),
+                stopping_criteria=StoppingCriteriaList([
+                    StopOnStrings(self.tokenizer, self._tokenizer_lock, len(input_ids[0]), limits)]),
+                pad_token_id=pad_id,
+                **generate_kwargs
+            )
+        new_tokens = output[:, len(input_ids[0]):]
+        with self._tokenizer_lock:
+            return self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+
+    def _generate_speculative(self, row, use_prefix, limit):
+        """
+        Greedy decoding of one prompt where each forward pass also scores a draft copied
+        from the prompt. Drafted tokens are kept up to the first one that differs from the
+        model's own argmax, and the cache is cropped back to the kept tokens, so the
+        result matches token-by-token greedy decoding.
+        """
+        start = time.perf_counter()
+        eos_id = self.tokenizer.eos_token_id
+        lookup = PromptLookup(row, self.ngram_size)
+        cache = copy.deepcopy(self.prefix_cache) if use_prefix else DynamicCache()
+        prompt_len = (len(self.prefix_ids) if use_prefix else 0) + len(row)
+        generated = []
+        forward_passes = drafted = accepted = 0
+        with torch.no_grad():
+            logits = self.model(input_ids=torch.tensor([row], device=self.device),
+                                past_key_values=cache, use_cache=True).logits[0, -1:]
+            while True:
+                # The cache holds everything but the newest token, whose prediction is logits[-1]
+                generated.append(int(logits[-1].argmax()))
+                if generated[-1] == eos_id or len(generated) >= limit or self._hit_stop(generated, 1):
+                    break
+                draft = lookup.propose(row[-self.ngram_size:] + generated, min(self.draft_tokens, limit - len(generated)))
+                step = [generated[-1]] + draft
+                logits = self.model(input_ids=torch.tensor([step], device=self.device),
+                                    past_key_values=cache, use_cache=True).logits[0]
+                forward_passes += 1
+                predicted = logits.argmax(-1).tolist()
+                kept = 0
+                while kept < len(draft) and predicted[kept] == draft[kept]:
+                    kept += 1
+                drafted += len(draft)
+                accepted += kept
+                generated.extend(draft[:kept])
+                if eos_id in draft[:kept]:
+                    del generated[generated.index(eos_id, len(generated) - kept):]
+                    break
+                if kept and (len(generated) >= limit or self._hit_stop(generated, kept)):
+                    break
+                cache.crop(prompt_len + len(generated))
+                logits = logits[:kept + 1]
+        self.speculation.record(len(generated), forward_passes + 1, drafted, accepted, time.perf_counter() - start)
+        with self._tokenizer_lock:
+            return self.tokenizer.decode(generated, skip_special_tokens=True)
+
+    def _hit_stop(self, generated, new_tokens, window=8):
+        with self._tokenizer_lock:
+            tail = self.tokenizer.decode(generated[-(new_tokens + window):], skip_special_tokens=True)
+        return any(stop in tail for stop in STOP_STRINGS)
+
+    def reset_stats(self):
+        self.speculation.reset()
+
+    def stats_summary(self):
+        return self.speculation.summary()
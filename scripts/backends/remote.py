@@ -0,0 +1,183 @@
+import asyncio
+import json
+import threading
+from urllib.parse import urlsplit
+
+from .base import STOP_STRINGS, LLMBackend, per_prompt, truncate_at_stop
+
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, body):
+        super().__init__(f"HTTP {status}: {body[:200]!r}")
+        self.status = status
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections to a single host, reused across requests."""
+
+    def __init__(self, host, port, size):
+        self.host = host
+        self.port = port
+        self.size = size
+        self._idle = []
+
+    async def acquire(self):
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            writer.close()
+        return await asyncio.open_connection(self.host, self.port)
+
+    def release(self, connection, reusable):
+        reader, writer = connection
+        if reusable and len(self._idle) < self.size and not writer.is_closing():
+            self._idle.append(connection)
+        else:
+            writer.close()
+
+    def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed before a response was received")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        body = b''.join(chunks)
+    elif 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    else:
+        body = await reader.read()
+        headers['connection'] = 'close'
+    return status, headers, body
+
+
+class AsyncHTTPBackend(LLMBackend):
+    """
+    Backend for an OpenAI-compatible completions server, e.g. a local inference server on localhost.
+    Requests run on a private asyncio loop with pooled keep-alive connections; up to
+    `concurrency` requests are in flight at once, each with a timeout and retries.
+    """
+
+    def __init__(self, endpoint='http://127.0.0.1:8000/v1/completions', model_name='TinyLlama/TinyLlama-1.1B-Chat-v1.0',
+                 concurrency=8, timeout=120.0, max_retries=3, max_new_tokens=200, temperature=0.7):
+        url = urlsplit(endpoint)
+        if url.scheme != 'http':
+            raise ValueError(f"Only plain http endpoints are supported, got {endpoint}")
+        self.endpoint = endpoint
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.path = url.path or '/'
+        self.model_name = model_name
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.requests = 0
+        self.retries = 0
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='http-backend-loop', daemon=True)
+        self._thread.start()
+        self._pool = ConnectionPool(self.host, self.port, concurrency)
+        self._semaphore = self._run(self._make_semaphore())
+
+    async def _make_semaphore(self):
+        return asyncio.Semaphore(self.concurrency)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def signature(self):
+        return {
+            'backend': 'http',
+            'model': self.model_name,
+            'max_new_tokens': self.max_new_tokens,
+            'temperature': self.temperature,
+        }
+
+    def generate_docstrings(self, prompts, max_new_tokens=None, temperature=None):
+        return self._run(self.agenerate_many(prompts, max_new_tokens, temperature))
+
+    async def agenerate_many(self, prompts, max_new_tokens=None, temperature=None):
+        limits = per_prompt(max_new_tokens, self.max_new_tokens, len(prompts))
+        return await asyncio.gather(*(self.agenerate(prompt, limit, temperature) for prompt, limit in zip(prompts, limits)))
+
+    async def agenerate(self, prompt, max_new_tokens=None, temperature=None):
+        payload = {
+            'model': self.model_name,
+            'prompt': prompt,
+            'max_tokens': self.max_new_tokens if max_new_tokens is None else max_new_tokens,
+            'temperature': self.temperature if temperature is None else temperature,
+            'stop': list(STOP_STRINGS),
+        }
+        response = await self.post(payload)
+        return truncate_at_stop(response['choices'][0]['text']).strip()
+
+    async def post(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self.requests += 1
+                    return await asyncio.wait_for(self._send(body), self.timeout)
+                except (ConnectionError, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, HTTPError) as error:
+                    retryable = not isinstance(error, HTTPError) or error.status in RETRYABLE_STATUS
+                    if not retryable or attempt == self.max_retries:
+                        raise
+                    self.retries += 1
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+
+    async def _send(self, body):
+        connection = await self._pool.acquire()
+        reusable = False
+        try:
+            reader, writer = connection
+            writer.write(
+                f"POST {self.path} HTTP/1.1\r\n"
+                f"Host: {self.host}:{self.port}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: keep-alive\r\n\r\n".encode('latin-1') + body
+            )
+            await writer.drain()
+            status, headers, response_body = await read_response(reader)
+            reusable = headers.get('connection', '').lower() != 'close'
+            if status != 200:
+                raise HTTPError(status, response_body.decode('utf-8', 'replace'))
+            return json.loads(response_body)
+        finally:
+            self._pool.release(connection, reusable)
+
+    def close(self):
+        async def shutdown():
+            self._pool.close()
+        self._run(shutdown())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
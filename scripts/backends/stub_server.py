@@ -0,0 +1,59 @@
+import argparse
+import hashlib
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubCompletionHandler(BaseHTTPRequestHandler):
+    """Answers /v1/completions with a deterministic docstring derived from the prompt."""
+
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    failure_rate = 0.0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path != '/v1/completions':
+            return self.reply(404, {'error': f"Unknown path {self.path}"})
+        if random.random() < self.failure_rate:
+            return self.reply(503, {'error': 'Injected failure'})
+        time.sleep(self.latency)
+        payload = json.loads(body)
+        digest = hashlib.sha256(payload['prompt'].encode('utf-8')).hexdigest()[:8]
+        # Like a model, keep going past the docstring unless the request asks to stop
+        text = f'Stub docstring {digest}.\n"""\n\nCode:\ndef next_example():\n    pass\n'
+        for stop in payload.get('stop') or []:
+            if stop in text:
+                text = text[:text.index(stop)]
+        self.reply(200, {'model': payload.get('model'), 'choices': [{'index': 0, 'text': text}]})
+
+    def reply(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host='127.0.0.1', port=8000, latency=0.0, failure_rate=0.0):
+    handler = type('Handler', (StubCompletionHandler,), {'latency': latency, 'failure_rate': failure_rate})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub completion server for testing the http backend")
+    parser.add_argument("--host", type=str, default='127.0.0.1', help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to sleep before each response")
+    parser.add_argument("--failure_rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 503")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency, args.failure_rate)
+    print(f"Stub completion server listening on http://{args.host}:{args.port}/v1/completions")
+    server.serve_forever()
@@ -0,0 +1,111 @@
+import ast
+import hashlib
+import json
+import os
+import sqlite3
+import textwrap
+import threading
+import time
+
+
+DEFAULT_CACHE_PATH = '.docstring_cache.sqlite'
+
+
+def normalize_source(source_code):
+    """Normalize source so formatting and comment-only edits keep the same key."""
+    source_code = textwrap.dedent(source_code or '')
+    try:
+        return ast.dump(ast.parse(source_code))
+    except SyntaxError:
+        return '\n'.join(line.rstrip() for line in source_code.strip().splitlines())
+
+
+def client_signature(llm_client):
+    """Describe the model and generation parameters that produced a docstring."""
+    if llm_client is None:
+        return None
+    if hasattr(llm_client, 'signature'):
+        return llm_client.signature()
+    return type(llm_client).__name__
+
+
+class DocstringCache:
+    """
+    Content-addressed docstring store backed by SQLite.
+    Entries are evicted least-recently-used first once max_entries is exceeded.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docstrings ("
+            "key TEXT PRIMARY KEY, docstring TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON docstrings (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(source_code, dependency_sources, prompt_template, llm_client, dependency_docstrings=None):
+        payload = json.dumps({
+            'source': normalize_source(source_code),
+            'dependencies': sorted(normalize_source(code) for code in (dependency_sources or {}).values()),
+            'dependency_docstrings': sorted((dependency_docstrings or {}).values()),
+            'template': prompt_template,
+            'llm': client_signature(llm_client),
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT docstring FROM docstrings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE docstrings SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key, docstring):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO docstrings (key, docstring, last_used) VALUES (?, ?, ?)",
+                (key, docstring, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM docstrings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM docstrings WHERE key IN "
+                "(SELECT key FROM docstrings ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docstrings").fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,137 @@
+import argparse
+import contextlib
+import os
+import socket
+import socketserver
+import sys
+import time
+import traceback
+
+from backends import BACKENDS
+from docstring_client import DEFAULT_SOCKET_PATH, read_messages, send_message
+from generate_docstrings import add_local_model_arguments, build_parser, llm_client_options, make_llm_client, run_from_args
+
+
+class SocketLog:
+    """File-like object that forwards printed output to the client line by line."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = ''
+
+    def write(self, text):
+        self.buffer += text
+        while '\n' in self.buffer:
+            line, self.buffer = self.buffer.split('\n', 1)
+            send_message(self.stream, {'log': line + '\n'})
+        return len(text)
+
+    def flush(self):
+        if self.buffer:
+            send_message(self.stream, {'log': self.buffer})
+            self.buffer = ''
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        for message in read_messages(self.rfile):
+            command = message.get('command')
+            if command == 'ping':
+                send_message(self.wfile, {'status': 'ok', 'info': f"Daemon up for {time.time() - server.started:.0f}s, "
+                                                                 f"model {server.llm_client.model_name}, "
+                                                                 f"{server.jobs} jobs served"})
+            elif command == 'shutdown':
+                server.stopping = True
+                send_message(self.wfile, {'status': 'ok', 'info': 'Daemon shutting down'})
+            elif command == 'run':
+                send_message(self.wfile, self.run_job(message))
+            else:
+                send_message(self.wfile, {'status': 'error', 'error': f"Unknown command {command!r}"})
+            return
+
+    def run_job(self, message):
+        server = self.server
+        log = SocketLog(self.wfile)
+        start = time.perf_counter()
+        print(f"Job from {message.get('cwd')}: {' '.join(message.get('args', []))}", file=sys.stderr)
+        previous_cwd = os.getcwd()
+        try:
+            with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+                os.chdir(message.get('cwd') or previous_cwd)
+                parser = build_parser()
+                parser.prog = 'generate_docstrings.py'
+                args = parser.parse_args(message.get('args', []))
+                run_from_args(args, server.llm_client)
+        except SystemExit as error:
+            # argparse reports bad arguments by exiting
+            log.flush()
+            return {'status': 'error', 'error': f"Invalid job arguments (exit code {error.code})"}
+        except Exception as error:
+            log.flush()
+            traceback.print_exc()
+            return {'status': 'error', 'error': f"{type(error).__name__}: {error}"}
+        finally:
+            os.chdir(previous_cwd)
+        log.flush()
+        server.jobs += 1
+        print(f"Job finished in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        return {'status': 'ok'}
+
+
+class DaemonServer(socketserver.UnixStreamServer):
+    """
+    Keeps one LLM backend loaded and runs submitted jobs one at a time;
+    further connections wait in the listen backlog.
+    """
+
+    def __init__(self, socket_path, llm_client):
+        self.llm_client = llm_client
+        self.started = time.time()
+        self.jobs = 0
+        self.stopping = False
+        super().__init__(socket_path, JobHandler)
+
+
+def remove_stale_socket(socket_path):
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except ConnectionRefusedError:
+            os.remove(socket_path)
+            return
+    raise RuntimeError(f"A daemon is already listening on {socket_path}")
+
+
+def serve(socket_path, llm_client):
+    remove_stale_socket(socket_path)
+    server = DaemonServer(socket_path, llm_client)
+    print(f"Daemon listening on {socket_path}")
+    try:
+        while not server.stopping:
+            server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+        llm_client.close()
+    print("Daemon stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the docstring model loaded and serve jobs from docstring_client.py")
+    parser.add_argument("--socket_path", type=str, default=DEFAULT_SOCKET_PATH, help="Unix socket to listen on")
+    parser.add_argument("--backend", type=str, choices=BACKENDS, default='local', help="Run the model in-process or call an inference server")
+    parser.add_argument("--endpoint", type=str, default=None, help="Completions URL for the http backend")
+    parser.add_argument("--model", type=str, default=None, help="Model name to load or request")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum in-flight requests for the http backend")
+    parser.add_argument("--request_timeout", type=float, default=120.0, help="Seconds before an http request is retried")
+    parser.add_argument("--max_retries", type=int, default=3, help="Retries per http request")
+    add_local_model_arguments(parser)
+    args = parser.parse_args()
+
+    client = make_llm_client(**llm_client_options(args))
+    serve(args.socket_path, client)
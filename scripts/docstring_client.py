@@ -0,0 +1,63 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), 'docstring_generator.sock')
+
+
+def send_message(stream, message):
+    stream.write((json.dumps(message) + '\n').encode('utf-8'))
+    stream.flush()
+
+
+def read_messages(stream):
+    for line in stream:
+        yield json.loads(line)
+
+
+def submit(socket_path, message):
+    """
+    Send one request to the daemon, echo its log output, and return the final reply.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        with sock.makefile('rwb') as stream:
+            send_message(stream, message)
+            for reply in read_messages(stream):
+                if 'log' in reply:
+                    print(reply['log'], end='')
+                elif 'status' in reply:
+                    return reply
+    return {'status': 'error', 'error': 'Daemon closed the connection without a reply'}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Submit a docstring generation job to a running daemon (see daemon.py). "
+                    "Arguments other than those below are passed on as generate_docstrings.py options, "
+                    "e.g. --source_dir src --output_dir out --incremental.")
+    parser.add_argument("--socket_path", type=str, default=DEFAULT_SOCKET_PATH, help="Unix socket the daemon listens on")
+    parser.add_argument("--ping", action="store_true", help="Only check that the daemon is up and report its model")
+    parser.add_argument("--shutdown", action="store_true", help="Ask the daemon to exit")
+    args, job_args = parser.parse_known_args()
+
+    if args.ping:
+        message = {'command': 'ping'}
+    elif args.shutdown:
+        message = {'command': 'shutdown'}
+    else:
+        # Relative paths in the job are resolved against this directory, as in a local run
+        message = {'command': 'run', 'cwd': os.getcwd(), 'args': job_args}
+    try:
+        reply = submit(args.socket_path, message)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"No daemon listening on {args.socket_path}. Start one with: python scripts/daemon.py", file=sys.stderr)
+        sys.exit(2)
+    if reply['status'] != 'ok':
+        print(f"Job failed: {reply.get('error')}", file=sys.stderr)
+        sys.exit(1)
+    if 'info' in reply:
+        print(reply['info'])
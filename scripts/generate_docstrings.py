@@ -2,37 +2,74 @@ import os
 import argparse
 from navigator import build_dependency_graph
 from agents.orchestrator import Orchestrator
+from agents.usage_index import UsageIndex
+from backends import BACKENDS, create_backend
+from cache import DocstringCache, DEFAULT_CACHE_PATH
+from utils import SourceStore, output_path
+from tracing import NULL_TRACER, Tracer
+from incremental import MANIFEST_NAME, Manifest, plan_incremental, update_manifest
 
-from transformers import AutoModelForCausalLM, AutoTokenizer
-import torch
-
-class LocalLLMClient:
-    def __init__(self, model_name='TinyLlama/TinyLlama-1.1B-Chat-v1.0', device='cpu'):
-        print(f"Loading model {model_name} on {device}...")
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModelForCausalLM.from_pretrained(model_name).to(device)
-        self.device = device
-
-    def generate_docstring(self, prompt, max_new_tokens=200, temperature=0.7):
-        inputs = self.tokenizer(prompt, return_tensors="pt").to(self.device)
-        output = self.model.generate(
-            **inputs,
-            max_new_tokens=max_new_tokens,
-            temperature=temperature,
-            do_sample=True,
-            pad_token_id=self.tokenizer.eos_token_id
-        )
-        return self.tokenizer.decode(output[0], skip_special_tokens=True).replace(prompt, '').strip()
-
-
-def main(source_dir, output_dir):
+LLM_CLIENT_OPTIONS = ('backend', 'endpoint', 'model', 'concurrency', 'request_timeout', 'max_retries',
+                      'quantize', 'num_threads', 'num_interop_threads', 'speculative', 'draft_tokens')
+
+def make_llm_client(backend='local', endpoint=None, model=None, concurrency=8, request_timeout=120.0, max_retries=3,
+                    quantize=False, num_threads=None, num_interop_threads=None, speculative=False, draft_tokens=8):
+    backend_options = {}
+    if model:
+        backend_options['model_name'] = model
+    if backend == 'local':
+        backend_options.update(quantize=quantize, num_threads=num_threads, num_interop_threads=num_interop_threads,
+                               speculative=speculative, draft_tokens=draft_tokens)
+    if backend == 'http':
+        backend_options.update(concurrency=concurrency, timeout=request_timeout, max_retries=max_retries)
+        if endpoint:
+            backend_options['endpoint'] = endpoint
+    return create_backend(backend, **backend_options)
+
+def main(source_dir, output_dir, cache_path=DEFAULT_CACHE_PATH, use_cache=True, cache_max_entries=100000,
+         incremental=False, batch_token_budget=8192, max_batch_size=16, workers=1,
+         usage_index_path=None, max_usage_refs=20, source_memory_mb=256, prompt_token_budget=1792,
+         parse_workers=None, backend='local', endpoint=None, model=None, concurrency=8,
+         request_timeout=120.0, max_retries=3, queue_size=64, metrics_path=None, trace_path=None,
+         llm_client=None, dedup=True, dedup_rename=False, llm_review=True, review_rate=0.0,
+         review_threshold=0.5, max_regenerations=1, quantize=False, num_threads=None, num_interop_threads=None,
+         speculative=False, draft_tokens=8, graph_snapshot_path=None):
+    """
+    llm_client: an already loaded backend to use (e.g. from the daemon); the backend
+        options are ignored and the client is left open.
+    """
+    tracer = Tracer(metrics_path, trace_path) if metrics_path or trace_path else NULL_TRACER
     print(f"Building dependency graph from: {source_dir}")
-    graph = build_dependency_graph(source_dir)
+    with tracer.span('graph_build', source_dir=source_dir) as span:
+        graph = build_dependency_graph(source_dir, parse_workers, graph_snapshot_path)
+        span.set(components=len(graph.nodes))
     print(f"Dependency graph built with {len(graph.nodes)} components.")
 
-    llm_client = LocalLLMClient()
+    manifest = Manifest.load(output_dir) if incremental else Manifest(os.path.join(output_dir, MANIFEST_NAME))
+    if incremental and manifest.is_empty():
+        print(f"No manifest found in {output_dir}, running a full generation.")
+    plan = plan_incremental(graph, source_dir, output_dir, manifest)
+    if incremental:
+        print(f"Incremental run: {plan}")
+        for filepath in plan.deleted_files:
+            path = output_path(output_dir, filepath)
+            if os.path.isfile(path):
+                os.remove(path)
+        if not plan.files_to_write:
+            update_manifest(manifest, plan, {})
+            print("Nothing changed since the last run.")
+            tracer.close()
+            return
+
+    owns_client = llm_client is None
+    if owns_client:
+        llm_client = make_llm_client(backend=backend, endpoint=endpoint, model=model, concurrency=concurrency,
+                                     request_timeout=request_timeout, max_retries=max_retries, quantize=quantize,
+                                     num_threads=num_threads, num_interop_threads=num_interop_threads,
+                                     speculative=speculative, draft_tokens=draft_tokens)
+    llm_client.reset_stats()
 
-    if os.path.exists(output_dir):
+    if not incremental and os.path.exists(output_dir):
         print(f"Output directory {output_dir} already exists. Removing it.")
         for root, dirs, files in os.walk(output_dir, topdown=False):
             for name in files:
@@ -40,14 +77,108 @@ def main(source_dir, output_dir):
             for name in dirs:
                 os.rmdir(os.path.join(root, name))
 
-    orchestrator = Orchestrator(graph, source_dir, output_dir, llm_client)
-    orchestrator.run()
+    cache = DocstringCache(cache_path, cache_max_entries) if use_cache else None
+
+    if usage_index_path:
+        usage_index = UsageIndex.load(source_dir, usage_index_path)
+        usage_index.save(usage_index_path)
+    else:
+        usage_index = UsageIndex(source_dir).build()
+
+    orchestrator = Orchestrator(graph, source_dir, output_dir, llm_client, cache,
+                                batch_token_budget=batch_token_budget, max_batch_size=max_batch_size,
+                                workers=workers, usage_index=usage_index, max_usage_refs=max_usage_refs,
+                                source_store=SourceStore(source_memory_mb * 1024 * 1024),
+                                prompt_token_budget=prompt_token_budget, queue_size=queue_size, tracer=tracer,
+                                dedup=dedup, dedup_rename=dedup_rename, llm_review=llm_review,
+                                review_rate=review_rate, review_threshold=review_threshold,
+                                max_regenerations=max_regenerations)
+    orchestrator.run(plan.files_to_write, plan.dirty_keys, manifest.previous_docstrings())
+    update_manifest(manifest, plan, orchestrator.docstrings)
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Docstring cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.1%} hit rate, {stats['entries']} entries)")
+        cache.close()
+    stats = orchestrator.verification_stats
+    print(f"Verification: {stats['PASS']} passed, {stats['WARNING']} warnings, {stats['FAIL']} failed, "
+          f"{stats['reviewed']} reviewed by the LLM, {stats['regenerated']} regenerated")
+    if dedup:
+        print(f"Deduplication saved {orchestrator.writer.dedup_saved} LLM calls")
+    totals = orchestrator.writer.prompt_totals
+    print(f"Prompts: {totals['prompts']} built, {totals['tokens_used']} tokens used, "
+          f"{totals['tokens_dropped']} tokens dropped from {totals['truncated']} prompts")
+    backend_stats = llm_client.stats_summary()
+    if backend_stats:
+        print(backend_stats)
+    if owns_client:
+        llm_client.close()
+    if tracer.enabled:
+        tracer.close()
+        print("Stage summary:")
+        print(tracer.summary())
     print("Docstring generation complete!")
 
-if __name__ == "__main__":
+def build_parser():
     parser = argparse.ArgumentParser(description="Generate docstrings for Python codebase.")
     parser.add_argument("--source_dir", type=str, required=True, help="Path to source code directory")
     parser.add_argument("--output_dir", type=str, required=True, help="Path to output directory for annotated files")
-    args = parser.parse_args()
+    parser.add_argument("--incremental", action="store_true", help="Only regenerate components changed since the last run and their dependents")
+    parser.add_argument("--graph_snapshot_path", type=str, default=None, help="Store the dependency graph here and only re-parse changed files between runs")
+    add_generation_arguments(parser)
+    return parser
 
-    main(args.source_dir, args.output_dir)
+def add_generation_arguments(parser):
+    """Options shared by single-process runs and shard workers."""
+    parser.add_argument("--cache_path", type=str, default=DEFAULT_CACHE_PATH, help="Path to the on-disk docstring cache")
+    parser.add_argument("--no_cache", action="store_true", help="Disable the docstring cache")
+    parser.add_argument("--cache_max_entries", type=int, default=100000, help="Maximum cached docstrings before LRU eviction")
+    parser.add_argument("--batch_token_budget", type=int, default=8192, help="Maximum prompt tokens per generation batch")
+    parser.add_argument("--max_batch_size", type=int, default=16, help="Maximum prompts per generation batch")
+    parser.add_argument("--workers", type=int, default=1, help="Number of generation batches to run concurrently")
+    parser.add_argument("--usage_index_path", type=str, default=None, help="Store the usage index here and update it incrementally between runs")
+    parser.add_argument("--max_usage_refs", type=int, default=20, help="Maximum usage references included per component")
+    parser.add_argument("--source_memory_mb", type=int, default=256, help="Memory budget for cached source files")
+    parser.add_argument("--prompt_token_budget", type=int, default=1792, help="Maximum prompt tokens per component, including the few-shot examples")
+    parser.add_argument("--parse_workers", type=int, default=None, help="Processes used to parse source files (default: CPU count)")
+    parser.add_argument("--backend", type=str, choices=BACKENDS, default='local', help="Run the model in-process or call an inference server")
+    parser.add_argument("--endpoint", type=str, default=None, help="Completions URL for the http backend (default: http://127.0.0.1:8000/v1/completions)")
+    parser.add_argument("--model", type=str, default=None, help="Model name to load or request")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum in-flight requests for the http backend")
+    parser.add_argument("--request_timeout", type=float, default=120.0, help="Seconds before an http request is retried")
+    parser.add_argument("--max_retries", type=int, default=3, help="Retries per http request on connection errors, timeouts and 5xx/429 responses")
+    parser.add_argument("--queue_size", type=int, default=64, help="Maximum items waiting in the verify and write stages before generation pauses")
+    parser.add_argument("--metrics_path", type=str, default=None, help="Write per-stage metrics as JSON lines to this path")
+    parser.add_argument("--trace_path", type=str, default=None, help="Write a Chrome trace of the run to this path")
+    parser.add_argument("--no_dedup", action="store_true", help="Generate separately for structurally identical components")
+    parser.add_argument("--dedup_rename", action="store_true", help="Also treat components that differ only in identifier names as duplicates")
+    parser.add_argument("--no_llm_review", action="store_true", help="Only run the static docstring checks")
+    parser.add_argument("--review_rate", type=float, default=0.0, help="Fraction of statically passing docstrings also sent for LLM review as spot checks")
+    parser.add_argument("--review_threshold", type=float, default=0.5, help="Static check confidence below which a docstring is sent for LLM review")
+    parser.add_argument("--max_regenerations", type=int, default=1, help="Times a docstring that fails verification is regenerated")
+    add_local_model_arguments(parser)
+
+def add_local_model_arguments(parser):
+    parser.add_argument("--quantize", action="store_true", help="Quantize the local model's linear layers to int8 (CPU only)")
+    parser.add_argument("--num_threads", type=int, default=None, help="Torch intra-op threads for the local model (default: all cores)")
+    parser.add_argument("--num_interop_threads", type=int, default=None, help="Torch inter-op threads for the local model")
+    parser.add_argument("--speculative", action="store_true", help="Decode greedily with prompt-lookup drafts copied from the component source")
+    parser.add_argument("--draft_tokens", type=int, default=8, help="Maximum drafted tokens checked per forward pass in speculative mode")
+
+def llm_client_options(args):
+    """make_llm_client keyword arguments from parsed backend options."""
+    return {name: getattr(args, name) for name in LLM_CLIENT_OPTIONS}
+
+def main_options(args):
+    """main() keyword arguments from parsed build_parser() options, with the negated flags turned around."""
+    options = vars(args).copy()
+    options['use_cache'] = not options.pop('no_cache')
+    options['dedup'] = not options.pop('no_dedup')
+    options['llm_review'] = not options.pop('no_llm_review')
+    return options
+
+def run_from_args(args, llm_client=None):
+    main(llm_client=llm_client, **main_options(args))
+
+if __name__ == "__main__":
+    run_from_args(build_parser().parse_args())
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+
+from utils import output_path
+
+
+MANIFEST_NAME = '.docstring_manifest.json'
+MANIFEST_VERSION = 1
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def component_key(component):
+    return f"{component.filepath}:{component.name}"
+
+
+def iter_source_files(source_dir):
+    for root, _, files in os.walk(source_dir):
+        for file in files:
+            if file.endswith('.py'):
+                yield os.path.join(root, file)
+
+
+class Manifest:
+    """
+    Record of the previous run: a hash per source file, and a hash plus the
+    generated docstring per component.
+    """
+
+    def __init__(self, path, files=None, components=None):
+        self.path = path
+        self.files = files or {}
+        self.components = components or {}
+
+    @classmethod
+    def load(cls, output_dir):
+        path = os.path.join(output_dir, MANIFEST_NAME)
+        if not os.path.isfile(path):
+            return cls(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != MANIFEST_VERSION:
+            return cls(path)
+        return cls(path, data.get('files'), data.get('components'))
+
+    def is_empty(self):
+        return not self.files
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': MANIFEST_VERSION,
+                'files': self.files,
+                'components': self.components,
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def previous_docstrings(self):
+        return {key: entry['docstring'] for key, entry in self.components.items() if entry.get('docstring')}
+
+
+class IncrementalPlan:
+    def __init__(self, dirty_keys, files_to_write, changed_files, deleted_files, file_hashes, component_hashes):
+        self.dirty_keys = dirty_keys
+        self.changed_files = changed_files
+        self.files_to_write = files_to_write
+        self.deleted_files = deleted_files
+        self.file_hashes = file_hashes
+        self.component_hashes = component_hashes
+
+    def __repr__(self):
+        return (f"IncrementalPlan({len(self.dirty_keys)} components to regenerate, "
+                f"{len(self.files_to_write)} files to write, {len(self.deleted_files)} files deleted)")
+
+
+def plan_incremental(graph, source_dir, output_dir, manifest):
+    """
+    Compare the current tree against the manifest. Components whose source
+    changed are dirty, and so is everything that depends on them through the
+    reverse edges of the dependency graph.
+    """
+    file_hashes = {}
+    changed_files = set()
+    for filepath in iter_source_files(source_dir):
+        with open(filepath, 'r', encoding='utf-8') as f:
+            file_hashes[filepath] = hash_text(f.read())
+        if manifest.files.get(filepath) != file_hashes[filepath]:
+            changed_files.add(filepath)
+    deleted_files = set(manifest.files) - set(file_hashes)
+
+    components_by_file = {}
+    for node_key, component in graph.nodes.items():
+        components_by_file.setdefault(component.filepath, []).append(component)
+
+    # Only changed files need their components re-hashed
+    component_hashes = {}
+    changed_keys = set()
+    for filepath in changed_files:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        for component in components_by_file.get(filepath, []):
+            key = component_key(component)
+            component_hashes[key] = hash_text(''.join(lines[component.lineno - 1:component.end_lineno]))
+            previous = manifest.components.get(key)
+            if previous is None or previous.get('hash') != component_hashes[key]:
+                changed_keys.add((component.filepath, component.name))
+
+    impacted = graph.dependents_of(changed_keys)
+    dirty_keys = {f"{filepath}:{name}" for filepath, name in impacted}
+
+    # Files without components, such as an empty __init__.py, have no annotated output
+    files_to_write = set(changed_files)
+    files_to_write.update(filepath for filepath, _ in impacted)
+    for filepath in components_by_file:
+        if not os.path.isfile(output_path(output_dir, filepath)):
+            files_to_write.add(filepath)
+    stale_files = files_to_write - set(components_by_file)
+    files_to_write -= stale_files
+
+    return IncrementalPlan(dirty_keys, files_to_write, changed_files, deleted_files | stale_files,
+                           file_hashes, component_hashes)
+
+
+def update_manifest(manifest, plan, docstrings):
+    """Fold the results of an incremental or full run back into the manifest."""
+    for filepath in plan.deleted_files:
+        manifest.files.pop(filepath, None)
+    # Components of deleted or edited files are re-recorded from this run's hashes
+    prefixes = tuple(f"{filepath}:" for filepath in plan.deleted_files | plan.changed_files)
+    if prefixes:
+        manifest.components = {key: entry for key, entry in manifest.components.items()
+                               if not key.startswith(prefixes) or key in plan.component_hashes}
+
+    manifest.files.update(plan.file_hashes)
+    for key, component_hash in plan.component_hashes.items():
+        manifest.components.setdefault(key, {})['hash'] = component_hash
+    for key, docstring in docstrings.items():
+        manifest.components.setdefault(key, {})['docstring'] = docstring
+    manifest.save()
@@ -1,15 +1,101 @@
 import os
 import ast
-from collections import defaultdict, deque
+import hashlib
+import marshal
+import sqlite3
+import sys
+from utils import SourceStore
+from array import array
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+
+class InternTable:
+    """Maps hashable values to small integer ids and back, storing each distinct value once."""
+
+    __slots__ = ('ids', 'values')
+
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def intern(self, value):
+        index = self.ids.get(value)
+        if index is None:
+            index = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class CallSite(namedtuple('CallSite', 'name type qualifier')):
+    """An unresolved call made by a component; qualifier is the receiver name of obj.method() calls."""
+
+    __slots__ = ()
+
+    @property
+    def component_id(self):
+        # Call sites have no file until they are resolved against the graph
+        return f"None:{self.name}:{self.type}"
+
+
+# marshal's format may change between Python versions, so snapshots are tied to one
+SNAPSHOT_VERSION = f"1:{sys.version_info[0]}.{sys.version_info[1]}"
+
+class ComponentTables:
+    """
+    Intern tables shared by the components of one graph, so each path and call site is
+    stored once. They live as long as the graph does, e.g. one daemon job.
+    """
+
+    __slots__ = ('file_paths', 'call_sites')
+
+    def __init__(self):
+        self.file_paths = InternTable()
+        self.call_sites = InternTable()
+
 
 class CodeComponent:
-    def __init__(self, name, component_type, filepath, node):
-        self.name = name
-        self.component_id = f"{filepath}:{name}:{component_type}"
-        self.type = component_type
-        self.filepath = filepath
-        self.node = node
-        self.dependencies = set()
+    """
+    Compact record of one function or class: name, type, file id, line span and the
+    ids of the distinct call sites in its body, both indices into its graph's tables.
+    No AST is kept.
+    """
+
+    __slots__ = ('name', 'type', 'file_id', 'lineno', 'end_lineno', 'callee_ids', 'tables')
+
+    def __init__(self, name, component_type, filepath, lineno=None, end_lineno=None, callees=(), tables=None):
+        self.tables = tables if tables is not None else ComponentTables()
+        self.name = sys.intern(name)
+        self.type = sys.intern(component_type)
+        self.file_id = self.tables.file_paths.intern(filepath)
+        self.lineno = lineno
+        self.end_lineno = end_lineno if end_lineno is not None else lineno
+        call_sites = self.tables.call_sites
+        self.callee_ids = tuple(call_sites.intern(CallSite(sys.intern(callee_name), sys.intern(callee_type), qualifier))
+                                for callee_name, callee_type, qualifier in callees)
+
+    @property
+    def filepath(self):
+        return self.tables.file_paths[self.file_id]
+
+    @property
+    def component_id(self):
+        return f"{self.filepath}:{self.name}:{self.type}"
+
+    @property
+    def dependencies(self):
+        call_sites = self.tables.call_sites
+        return [call_sites[callee_id] for callee_id in self.callee_ids]
+
+    def __reduce__(self):
+        # Ids are only meaningful in this graph's tables, so pickle the values they stand for
+        return (CodeComponent, (self.name, self.type, self.filepath, self.lineno, self.end_lineno, self.dependencies))
 
     def __hash__(self):
         # For set and dict keys, consider name + filepath + type to distinguish
@@ -22,12 +108,143 @@ class CodeComponent:
         return f"{self.type}: {self.name} ({self.filepath})"
 
 
-from collections import defaultdict, deque
+class CompactGraph:
+    """
+    Integer-indexed snapshot of a DependencyGraph.
+    Node i is keys[i]; its successors are targets[offsets[i]:offsets[i + 1]] (CSR layout).
+    """
+
+    def __init__(self, keys, offsets, targets):
+        self.keys = keys
+        self.offsets = offsets
+        self.targets = targets
+
+    @classmethod
+    def from_graph(cls, graph):
+        keys = list(graph.nodes)
+        ids = {key: i for i, key in enumerate(keys)}
+        offsets = array('q', [0])
+        targets = array('q')
+        for key in keys:
+            # Sorted, so the traversal order does not depend on set iteration order
+            targets.extend(sorted(ids[to_key] for to_key in graph.edges.get(key, ()) if to_key in ids))
+            offsets.append(len(targets))
+        return cls(keys, offsets, targets)
+
+    @classmethod
+    def from_adjacency(cls, num_nodes, successors):
+        """Build from an iterable of successor id lists, one per node."""
+        offsets = array('q', [0])
+        targets = array('q')
+        for node_successors in successors:
+            targets.extend(node_successors)
+            offsets.append(len(targets))
+        return cls(list(range(num_nodes)), offsets, targets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def successors(self, node):
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def tarjan_scc(self):
+        """
+        Iterative Tarjan's algorithm; returns SCCs as lists of node ids in the same
+        order as the recursive formulation (every SCC after the SCCs it reaches).
+        """
+        num_nodes = len(self)
+        offsets, targets = self.offsets, self.targets
+        indices = array('q', [-1]) * num_nodes
+        lowlink = array('q', [0]) * num_nodes
+        on_stack = bytearray(num_nodes)
+        stack = []
+        sccs = []
+        counter = 0
+
+        for root in range(num_nodes):
+            if indices[root] != -1:
+                continue
+            indices[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            # Each frame is [node, position of the next edge to explore]
+            work = [[root, offsets[root]]]
+            while work:
+                frame = work[-1]
+                node, position = frame
+                if position < offsets[node + 1]:
+                    frame[1] = position + 1
+                    neighbor = targets[position]
+                    if indices[neighbor] == -1:
+                        indices[neighbor] = lowlink[neighbor] = counter
+                        counter += 1
+                        stack.append(neighbor)
+                        on_stack[neighbor] = 1
+                        work.append([neighbor, offsets[neighbor]])
+                    elif on_stack[neighbor] and indices[neighbor] < lowlink[node]:
+                        lowlink[node] = indices[neighbor]
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if lowlink[node] < lowlink[parent]:
+                        lowlink[parent] = lowlink[node]
+                # If node is root of SCC
+                if lowlink[node] == indices[node]:
+                    scc = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = 0
+                        scc.append(w)
+                        if w == node:
+                            break
+                    sccs.append(scc)
+        return sccs
+
+    def condense(self, sccs):
+        """Return the DAG of SCCs as a CompactGraph whose node ids are SCC indices."""
+        scc_of = array('q', [0]) * len(self)
+        for i, scc in enumerate(sccs):
+            for node in scc:
+                scc_of[node] = i
+        successors = []
+        for i, scc in enumerate(sccs):
+            scc_successors = set()
+            for node in scc:
+                for neighbor in self.successors(node):
+                    if scc_of[neighbor] != i:
+                        scc_successors.add(scc_of[neighbor])
+            successors.append(sorted(scc_successors))
+        return CompactGraph.from_adjacency(len(sccs), successors)
+
+    def topological_order(self):
+        """Kahn's algorithm over node ids; raises ValueError if the graph has a cycle."""
+        num_nodes = len(self)
+        in_degree = array('q', [0]) * num_nodes
+        for target in self.targets:
+            in_degree[target] += 1
+        queue = deque(i for i in range(num_nodes) if in_degree[i] == 0)
+        order = []
+        while queue:
+            current = queue.popleft()
+            order.append(current)
+            for neighbor in self.successors(current):
+                in_degree[neighbor] -= 1
+                if in_degree[neighbor] == 0:
+                    queue.append(neighbor)
+        if len(order) != num_nodes:
+            raise ValueError("Cycle detected in condensed graph - this should not happen")
+        return order
+
 
 class DependencyGraph:
     def __init__(self):
         self.nodes = {}  # key = (filepath, name), value = CodeComponent
         self.edges = defaultdict(set)  # adjacency list
+        self.imports = {}  # key = filepath, value = {local name: (module, imported name or None)}
+        self.tables = ComponentTables()  # shared with the components built for this graph
 
     def add_node(self, component):
         key = (component.filepath, component.name)
@@ -38,217 +255,510 @@ class DependencyGraph:
         to_key = (to_component.filepath, to_component.name)
         self.edges[from_key].add(to_key)
 
-    def tarjan_scc(self):
-        """Find strongly connected components using Tarjan's algorithm."""
-        index = 0
-        stack = []
-        on_stack = set()
-        indices = {}
-        lowlink = {}
-        sccs = []
-
-        def strongconnect(node):
-            nonlocal index
-            indices[node] = index
-            lowlink[node] = index
-            index += 1
-            stack.append(node)
-            on_stack.add(node)
-
-            for neighbor in self.edges.get(node, []):
-                if neighbor not in indices:
-                    strongconnect(neighbor)
-                    lowlink[node] = min(lowlink[node], lowlink[neighbor])
-                elif neighbor in on_stack:
-                    lowlink[node] = min(lowlink[node], indices[neighbor])
-
-            # If node is root of SCC
-            if lowlink[node] == indices[node]:
-                scc = []
-                while True:
-                    w = stack.pop()
-                    on_stack.remove(w)
-                    scc.append(w)
-                    if w == node:
-                        break
-                sccs.append(scc)
-
-        for node in self.nodes:
-            if node not in indices:
-                strongconnect(node)
-
-        return sccs
-
-    def build_condensed_graph(self, sccs):
-        """
-        Build a new graph where each SCC is a single node.
-        Returns:
-          - condensed_nodes: list of SCCs (each SCC is a list of node keys)
-          - condensed_edges: adjacency dict mapping SCC index to set of SCC indices
-        """
-        # Map node to SCC index
-        node_to_scc = {}
-        for i, scc in enumerate(sccs):
-            for node in scc:
-                node_to_scc[node] = i
-
-        condensed_edges = defaultdict(set)
-        for from_node, to_nodes in self.edges.items():
-            from_scc = node_to_scc[from_node]
-            for to_node in to_nodes:
-                to_scc = node_to_scc[to_node]
-                if from_scc != to_scc:
-                    condensed_edges[from_scc].add(to_scc)
-
-        return sccs, condensed_edges
-
-    def topological_sort_condensed(self, condensed_edges, num_nodes):
-        """Topologically sort the condensed DAG."""
-        in_degree = [0] * num_nodes
-        for from_node, neighbors in condensed_edges.items():
-            for neighbor in neighbors:
-                in_degree[neighbor] += 1
-
-        queue = deque([i for i, deg in enumerate(in_degree) if deg == 0])
-        sorted_scc_indices = []
-
+    def reverse_edges(self):
+        """Map each node key to the set of node keys that depend on it."""
+        reverse = defaultdict(set)
+        for from_key, to_keys in self.edges.items():
+            for to_key in to_keys:
+                reverse[to_key].add(from_key)
+        return reverse
+
+    def dependents_of(self, keys):
+        """Return the given node keys plus every node that transitively depends on them."""
+        reverse = self.reverse_edges()
+        impacted = set(keys)
+        queue = deque(impacted)
         while queue:
-            current = queue.popleft()
-            sorted_scc_indices.append(current)
-            for neighbor in condensed_edges.get(current, []):
-                in_degree[neighbor] -= 1
-                if in_degree[neighbor] == 0:
-                    queue.append(neighbor)
-
-        if len(sorted_scc_indices) != num_nodes:
-            raise ValueError("Cycle detected in condensed graph - this should not happen")
+            key = queue.popleft()
+            for dependent in reverse.get(key, ()):
+                if dependent not in impacted:
+                    impacted.add(dependent)
+                    queue.append(dependent)
+        return impacted
+
+    def subgraph(self, keys):
+        """Return a graph of the given node keys and the edges among them."""
+        keys = set(keys)
+        sub = DependencyGraph()
+        sub.imports = self.imports
+        sub.tables = self.tables
+        for key in keys:
+            sub.nodes[key] = self.nodes[key]
+            targets = self.edges.get(key, set()) & keys
+            if targets:
+                sub.edges[key] = targets
+        return sub
+
+    def compact(self):
+        return CompactGraph.from_graph(self)
 
-        return sorted_scc_indices
+    def tarjan_scc(self):
+        """Find strongly connected components using Tarjan's algorithm."""
+        compact = self.compact()
+        return [[compact.keys[node] for node in scc] for scc in compact.tarjan_scc()]
 
     def topological_sort(self):
         """
         Returns a list of CodeComponent lists, where each list is an SCC group of components.
         Single-node SCCs have one component.
         """
-        sccs = self.tarjan_scc()
-        condensed_nodes, condensed_edges = self.build_condensed_graph(sccs)
-        sorted_scc_indices = self.topological_sort_condensed(condensed_edges, len(condensed_nodes))
-
-        # Map SCC index to list of components
-        scc_components = []
-        for scc in condensed_nodes:
-            comp_list = [self.nodes[node_key] for node_key in scc]
-            scc_components.append(comp_list)
+        compact = self.compact()
+        sccs = compact.tarjan_scc()
+        sorted_scc_indices = compact.condense(sccs).topological_order()
 
         # Return components in topological order of SCC groups
-        sorted_components = []
-        for idx in sorted_scc_indices:
-            sorted_components.append(scc_components[idx])
+        return [[self.nodes[compact.keys[node]] for node in sccs[idx]] for idx in sorted_scc_indices]
+
+
+def module_name(filepath, source_dir):
+    """Dotted module path of a file relative to the source root, e.g. pkg/util.py -> pkg.util."""
+    relpath = os.path.splitext(os.path.relpath(filepath, source_dir))[0]
+    parts = [part for part in relpath.split(os.sep) if part not in ('', '.')]
+    if parts and parts[-1] == '__init__':
+        parts.pop()
+    return '.'.join(parts)
 
-        return sorted_components
 
+class RecordVisitor(ast.NodeVisitor):
+    """
+    Collects compact component records from a module tree:
+    (name, type, lineno, end_lineno, callees) with callees as (name, type, qualifier) tuples.
+    """
 
-def parse_code(filepath):
+    def __init__(self):
+        self.records = []
+        self.imports = {}
+        self.current_callees = None
+
+    def visit_component(self, node, component_type):
+        callees = set()
+        self.current_callees = callees
+        self.generic_visit(node)
+        self.records.append((node.name, component_type, node.lineno, getattr(node, 'end_lineno', node.lineno),
+                             tuple(sorted(callees, key=str))))
+        self.current_callees = None
+
+    def visit_FunctionDef(self, node):
+        self.visit_component(node, 'function')
+
+    def visit_AsyncFunctionDef(self, node):
+        self.visit_component(node, 'async_function')
+
+    def visit_ClassDef(self, node):
+        self.visit_component(node, 'class')
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            if alias.asname:
+                self.imports[alias.asname] = (alias.name, None)
+            else:
+                top_level = alias.name.split('.')[0]
+                self.imports[top_level] = (top_level, None)
+
+    def visit_ImportFrom(self, node):
+        module = '.' * node.level + (node.module or '')
+        for alias in node.names:
+            if alias.name != '*':
+                self.imports[alias.asname or alias.name] = (module, alias.name)
+
+    def visit_Call(self, node):
+        # Handle function or method calls inside components
+        if self.current_callees is not None:
+            # Function calls like foo()
+            if isinstance(node.func, ast.Name):
+                self.current_callees.add((node.func.id, 'function', None))
+            # Method calls like obj.method(); keep the receiver name so module.func() can be resolved
+            elif isinstance(node.func, ast.Attribute):
+                qualifier = node.func.value.id if isinstance(node.func.value, ast.Name) else None
+                self.current_callees.add((node.func.attr, 'method', qualifier))
+        self.generic_visit(node)
+
+
+def parse_file_records(filepath):
+    """
+    Parse one file into picklable records so it can run in a worker process.
+    Returns (filepath, records, imports); the AST is discarded before returning.
+    """
     with open(filepath, 'r', encoding='utf-8') as file:
         source = file.read()
-    tree = ast.parse(source)
-    components = []
-
-    class DependencyVisitor(ast.NodeVisitor):
-        def __init__(self):
-            self.current_component = None
-        
-        def visit_FunctionDef(self, node):
-            component = CodeComponent(node.name, 'function', filepath, node)
-            self.current_component = component
-            self.generic_visit(node)
-            components.append(component)
-            self.current_component = None
-
-        def visit_AsyncFunctionDef(self, node):
-            component = CodeComponent(node.name, 'async_function', filepath, node)
-            self.current_component = component
-            self.generic_visit(node)
-            components.append(component)
-            self.current_component = None
-        
-        def visit_ClassDef(self, node):
-            component = CodeComponent(node.name, 'class', filepath, node)
-            self.current_component = component
-            self.generic_visit(node)
-            components.append(component)
-            self.current_component = None
-
-        def visit_Call(self, node):
-            # Handle function or method calls inside components
-            if self.current_component:
-                # Function calls like foo()
-                if isinstance(node.func, ast.Name):
-                    callee_name = node.func.id
-                    callee_comp = CodeComponent(callee_name, 'function', None, node)
-                    self.current_component.dependencies.add(callee_comp)
-                # Method calls like obj.method()
-                elif isinstance(node.func, ast.Attribute):
-                    callee_name = node.func.attr
-                    callee_comp = CodeComponent(callee_name, 'method', None, node)
-                    self.current_component.dependencies.add(callee_comp)
-            self.generic_visit(node)
-
-    visitor = DependencyVisitor()
-    visitor.visit(tree)
-    return components
-
-
-def build_dependency_graph(source_dir):
-    graph = DependencyGraph()
-    all_components = []
-
+    visitor = RecordVisitor()
+    visitor.visit(ast.parse(source))
+    return filepath, visitor.records, visitor.imports
+
+
+def components_from_records(filepath, records, tables=None):
+    if tables is None:
+        tables = ComponentTables()
+    return [CodeComponent(name, component_type, filepath, lineno, end_lineno, callees, tables)
+            for name, component_type, lineno, end_lineno, callees in records]
+
+
+def parse_code(filepath, imports=None, tables=None):
+    """
+    Extract functions and classes from a file along with the calls they make.
+    imports: optional dict filled with local name -> (module, imported name or None)
+    for the file's import statements. Relative modules keep their leading dots.
+    tables: optional ComponentTables to intern into, usually a DependencyGraph's.
+    """
+    _, records, file_imports = parse_file_records(filepath)
+    if imports is not None:
+        imports.update(file_imports)
+    return components_from_records(filepath, records, tables)
+
+
+class ImportResolver:
+    """
+    Resolves call dependencies to graph nodes through a (name, type) index.
+    When a name has several definitions, the caller's own file and its imports
+    are used to narrow the candidates.
+    """
+
+    def __init__(self, graph, source_dir):
+        self.graph = graph
+        self.index = defaultdict(list)
+        self.file_index = defaultdict(list)
+        for component in graph.nodes.values():
+            self.index[(component.name, component.type)].append(component)
+            self.file_index[(component.name, component.type, component.filepath)].append(component)
+        self.file_modules = {}
+        for filepath in {component.filepath for component in graph.nodes.values()} | set(graph.imports):
+            self.file_modules[filepath] = module_name(filepath, source_dir)
+        self.module_files = {module: filepath for filepath, module in self.file_modules.items()}
+
+    def absolute_module(self, module, filepath):
+        """Turn a relative module such as ..util into a dotted path from the source root."""
+        level = len(module) - len(module.lstrip('.'))
+        if level == 0:
+            return module
+        package = self.file_modules[filepath].split('.')
+        if os.path.basename(filepath) != '__init__.py':
+            package = package[:-1]
+        if level > 1:
+            package = package[:-(level - 1)]
+        remainder = module[level:]
+        return '.'.join(package + ([remainder] if remainder else []))
+
+    def module_file(self, module, filepath):
+        module = self.absolute_module(module, filepath)
+        # Imports may be rooted above source_dir (e.g. pkg.util when source_dir is pkg/)
+        while module:
+            if module in self.module_files:
+                return self.module_files[module]
+            module = module.partition('.')[2]
+        return None
+
+    def resolve(self, component, dep):
+        imports = self.graph.imports.get(component.filepath, {})
+        qualifier = dep.qualifier
+
+        # module.func() where module is an imported module
+        if dep.type == 'method' and qualifier in imports:
+            module, imported_name = imports[qualifier]
+            if imported_name is not None:
+                module = f"{module}.{imported_name}" if module.strip('.') else module + imported_name
+            target = self.module_file(module, component.filepath)
+            if target is not None:
+                matches = self.file_index.get((dep.name, 'function', target))
+                if matches:
+                    return matches
+
+        # from module import func [as alias]
+        if dep.name in imports and imports[dep.name][1] is not None:
+            module, imported_name = imports[dep.name]
+            target = self.module_file(module, component.filepath)
+            matches = self.file_index.get((imported_name, dep.type, target))
+            if matches:
+                return matches
+
+        candidates = self.index.get((dep.name, dep.type), [])
+        if len(candidates) > 1:
+            local = self.file_index.get((dep.name, dep.type, component.filepath))
+            if local:
+                return local
+        return candidates
+
+
+def parse_tree(filepaths, workers=None):
+    """
+    Yield parse_file_records results for every file, fanned out over a process
+    pool when workers > 1.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(filepaths) < 2 * workers:
+        for filepath in filepaths:
+            yield parse_file_records(filepath)
+        return
+    chunksize = max(1, len(filepaths) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(parse_file_records, filepaths, chunksize=chunksize)
+
+
+def source_files(source_dir):
+    filepaths = []
     for root, _, files in os.walk(source_dir):
         for file in files:
             if file.endswith('.py'):
-                filepath = os.path.join(root, file)
-                components = parse_code(filepath)
-                for comp in components:
-                    graph.add_node(comp)
-                all_components.extend(components)
+                filepaths.append(os.path.join(root, file))
+    return filepaths
 
-    # Build edges by matching dependencies by name and type ignoring filepath for dependency (which may be None)
-    for component in all_components:
-        for dep in list(component.dependencies):
-            matches = [node for node in graph.nodes.values() if node.name == dep.name and node.type == dep.type]
-            for matched_comp in matches:
+
+def link_components(graph, components, resolver):
+    """Add the edges from each component to the graph nodes its call sites resolve to."""
+    for component in components:
+        for dep in component.dependencies:
+            for matched_comp in resolver.resolve(component, dep):
                 graph.add_edge(component, matched_comp)
 
+
+def build_dependency_graph(source_dir, workers=None, snapshot_path=None):
+    """
+    Parse every .py file under source_dir and link components to the components they call.
+    workers: number of parser processes; defaults to the CPU count, 1 parses in-process.
+    snapshot_path: optional GraphSnapshot database; only files changed since it was
+        saved are parsed, and the updated graph is saved back to it.
+    """
+    if snapshot_path:
+        snapshot = GraphSnapshot(snapshot_path)
+        try:
+            return snapshot.update(source_dir, workers)
+        finally:
+            snapshot.close()
+
+    graph = DependencyGraph()
+    all_components = []
+    for filepath, records, imports in parse_tree(source_files(source_dir), workers):
+        graph.imports[filepath] = imports
+        components = components_from_records(filepath, records, graph.tables)
+        for comp in components:
+            graph.add_node(comp)
+        all_components.extend(components)
+
+    # Build edges by matching dependencies by name and type ignoring filepath for dependency (which may be None)
+    link_components(graph, all_components, ImportResolver(graph, source_dir))
     return graph
 
 
-def get_source_segment(filepath, node):
-    """Extract source code segment of node using lineno and end_lineno."""
+class GraphSnapshot:
+    """
+    SQLite store of a dependency graph. The files table holds each source file's stat
+    and content hash; the graph table holds one marshal blob with every component,
+    the call sites they make and the edges as node indices, so a warm load is a
+    single read with no parsing or name resolution.
+
+    Files whose content changed are re-parsed and patched into the loaded graph.
+    Only components those files can affect are re-linked: their own, the callers of
+    names whose definitions were added or removed, and every component when files
+    were added or deleted, since module paths may then resolve differently.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, hash TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS graph (id INTEGER PRIMARY KEY, data BLOB NOT NULL)")
+        self._conn.commit()
+
+    def load(self, source_dir):
+        """
+        Returns:
+            tuple: (graph, {path: [components]}, {path: (mtime_ns, size, hash)}), or
+                (None, {}, {}) when the snapshot holds no graph for source_dir. The
+                component lists keep components whose names repeat within a file.
+        """
+        meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        row = self._conn.execute("SELECT data FROM graph WHERE id = 0").fetchone()
+        if meta.get('version') != SNAPSHOT_VERSION or meta.get('source_dir') != source_dir or row is None:
+            return None, {}, {}
+        paths, call_sites, file_components, imports, edges = marshal.loads(row[0])
+
+        graph = DependencyGraph()
+        graph.imports = imports
+        tables = graph.tables
+        # The stored call sites are distinct, so their snapshot ids are the ids in the fresh table
+        for call_site in call_sites:
+            tables.call_sites.intern(CallSite(*call_site))
+        nodes = graph.nodes
+        components_by_file = {}
+        new = object.__new__
+        for path, records in zip(paths, file_components):
+            file_id = tables.file_paths.intern(path)
+            components_by_file[path] = components = []
+            for name, component_type, lineno, end_lineno, callee_ids in records:
+                component = new(CodeComponent)
+                component.name = name
+                component.type = component_type
+                component.file_id = file_id
+                component.lineno = lineno
+                component.end_lineno = end_lineno
+                component.callee_ids = callee_ids
+                component.tables = tables
+                components.append(component)
+                nodes[(path, name)] = component
+        keys = list(nodes)
+        for source, targets in edges:
+            graph.edges[keys[source]] = set(map(keys.__getitem__, targets))
+        stats = {row[0]: row[1:] for row in self._conn.execute("SELECT path, mtime_ns, size, hash FROM files")}
+        return graph, components_by_file, stats
+
+    def save(self, source_dir, graph, components_by_file, file_order, changed_stats, deleted):
+        """Write the graph, with files in file_order, and the stat rows that changed."""
+        paths = [path for path in file_order if path in graph.imports]
+        used = set().union(*(component.callee_ids for components in components_by_file.values()
+                             for component in components))
+        table = graph.tables.call_sites
+        if 2 * len(used) >= len(table):
+            # Mostly live call sites: store the table as it is
+            call_sites, remap = table.values, None
+        else:
+            # The table still holds many call sites of re-parsed or deleted files
+            call_sites = [table[callee_id] for callee_id in sorted(used)]
+            remap = {callee_id: index for index, callee_id in enumerate(sorted(used))}
+        file_components = []
+        index = {}
+        for path in paths:
+            records = []
+            for component in components_by_file.get(path, ()):
+                callee_ids = component.callee_ids if remap is None else tuple(map(remap.__getitem__, component.callee_ids))
+                records.append((component.name, component.type, component.lineno, component.end_lineno, callee_ids))
+                # Node indices follow first insertion, as in load()
+                index.setdefault((path, component.name), len(index))
+            file_components.append(tuple(records))
+        edges = [(index[key], tuple(map(index.__getitem__, targets)))
+                 for key, targets in graph.edges.items() if targets]
+        data = marshal.dumps((paths, [tuple(call_site) for call_site in call_sites], file_components,
+                              {path: graph.imports[path] for path in paths}, edges))
+
+        self._conn.execute("INSERT OR REPLACE INTO graph (id, data) VALUES (0, ?)", (data,))
+        self._conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                               [('version', SNAPSHOT_VERSION), ('source_dir', source_dir)])
+        self.save_stats(changed_stats, deleted)
+
+    def save_stats(self, changed_stats, deleted):
+        self._conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in deleted])
+        self._conn.executemany("INSERT OR REPLACE INTO files (path, mtime_ns, size, hash) VALUES (?, ?, ?, ?)",
+                               [(path,) + stat for path, stat in changed_stats.items()])
+        self._conn.commit()
+
+    def update(self, source_dir, workers=None):
+        """Load the graph for source_dir, re-parse and re-link only what changed, and save it back."""
+        graph, components_by_file, stored = self.load(source_dir)
+        if graph is None:
+            self._conn.execute("DELETE FROM files")
+            graph, components_by_file, stored = DependencyGraph(), {}, {}
+        file_order = source_files(source_dir)
+        to_parse = []
+        changed_stats = {}
+        for filepath in file_order:
+            stat = os.stat(filepath)
+            row = stored.get(filepath)
+            if row is not None and row[:2] == (stat.st_mtime_ns, stat.st_size):
+                continue
+            with open(filepath, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            changed_stats[filepath] = (stat.st_mtime_ns, stat.st_size, digest)
+            if row is None or row[2] != digest:
+                to_parse.append(filepath)
+        deleted = set(stored) - set(file_order)
+        if not to_parse and not deleted:
+            if changed_stats:
+                # Touched but not edited, e.g. by a checkout
+                self.save_stats(changed_stats, ())
+            print(f"Graph snapshot: loaded {len(graph.nodes)} components, no files changed")
+            return graph
+
+        # Other files only resolve calls against the (name, type) pairs a file defines,
+        # so their edges can change only where those pairs were added or removed
+        definitions = {}
+        for filepath in deleted.union(to_parse):
+            definitions[filepath] = set()
+            for component in components_by_file.pop(filepath, ()):
+                definitions[filepath].add((component.name, component.type))
+                graph.edges.pop((filepath, component.name), None)
+            graph.imports.pop(filepath, None)
+        changed_names = set()
+        for filepath in deleted:
+            changed_names.update(name for name, _ in definitions[filepath])
+        for filepath, records, imports in parse_tree(to_parse, workers):
+            graph.imports[filepath] = imports
+            components_by_file[filepath] = components_from_records(filepath, records, graph.tables)
+            defined = {(component.name, component.type) for component in components_by_file[filepath]}
+            changed_names.update(name for name, _ in defined ^ definitions[filepath])
+
+        # Rebuild the node table in walk order so the graph matches a fresh build
+        graph.nodes = {}
+        for filepath in file_order:
+            for component in components_by_file.get(filepath, ()):
+                graph.add_node(component)
+
+        if deleted or any(filepath not in stored for filepath in to_parse):
+            relinked = set(components_by_file)
+        else:
+            relinked = set(to_parse)
+            names_to_call_sites = defaultdict(set)
+            for callee_id, call_site in enumerate(graph.tables.call_sites.values):
+                names_to_call_sites[call_site.name].add(callee_id)
+            affected = set()
+            for name in changed_names:
+                affected.update(names_to_call_sites.get(name, ()))
+            for filepath, components in components_by_file.items():
+                if filepath in relinked:
+                    continue
+                # Calls through "from module import name as alias" resolve by the imported name
+                file_affected = affected.union(*(names_to_call_sites.get(local, ())
+                                                 for local, (_, imported) in graph.imports.get(filepath, {}).items()
+                                                 if imported in changed_names))
+                if any(not file_affected.isdisjoint(component.callee_ids) for component in components):
+                    relinked.add(filepath)
+        resolver = ImportResolver(graph, source_dir)
+        for filepath in relinked:
+            for component in components_by_file[filepath]:
+                graph.edges.pop((filepath, component.name), None)
+        for filepath in relinked:
+            link_components(graph, components_by_file[filepath], resolver)
+
+        self.save(source_dir, graph, components_by_file, file_order, changed_stats, deleted)
+        print(f"Graph snapshot: {len(to_parse)} files parsed, {len(deleted)} removed, "
+              f"{len(relinked)} files re-linked, {len(graph.nodes)} components")
+        return graph
+
+    def close(self):
+        self._conn.close()
+
+
+def get_source_segment(filepath, node, source_store=None):
+    """Extract source code segment of node (an AST node or CodeComponent) using lineno and end_lineno."""
+    end = getattr(node, "end_lineno", node.lineno)
+    if source_store is not None:
+        return source_store.segment(filepath, node.lineno, end)
     with open(filepath, "r", encoding="utf-8") as f:
         lines = f.readlines()
-    start = node.lineno - 1
-    end = getattr(node, "end_lineno", node.lineno)
-    return "".join(lines[start:end])
+    return "".join(lines[node.lineno - 1:end])
 
 
-def build_component_dicts(sorted_components):
+def build_component_dicts(sorted_components, source_store=None):
+    if source_store is None:
+        source_store = SourceStore()
     comp_id_map = {}
+    name_index = {}  # (name, type) -> first component id with that name and type
     for comp in sorted_components:
         comp_id = f"{comp.filepath}::{comp.name}::{comp.type}"
         comp_id_map[(comp.filepath, comp.name, comp.type)] = comp_id
-    
+        name_index.setdefault((comp.name, comp.type), comp_id)
+
     components_list = []
     for comp in sorted_components:
         comp_id = comp_id_map[(comp.filepath, comp.name, comp.type)]
-        source_code = get_source_segment(comp.filepath, comp.node)
+        source_code = get_source_segment(comp.filepath, comp, source_store)
 
         dep_ids = []
         for dep in comp.dependencies:
-            resolved = None
-            for key, cid in comp_id_map.items():
-                if key[1] == dep.name and key[2] == dep.type:
-                    resolved = cid
-                    break
+            resolved = name_index.get((dep.name, dep.type))
             if resolved:
                 dep_ids.append(resolved)
 
@@ -268,9 +778,11 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Navigator: build dependency graph and sort components")
     parser.add_argument("--source_dir", type=str, required=True, help="Root source directory to scan")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--snapshot_path", type=str, default=None, help="Graph snapshot to load and update instead of parsing every file")
     args = parser.parse_args()
 
-    graph = build_dependency_graph(args.source_dir)
+    graph = build_dependency_graph(args.source_dir, args.workers, args.snapshot_path)
     sorted_components = graph.topological_sort()
 
     print("Topologically sorted components:")
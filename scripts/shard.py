@@ -0,0 +1,416 @@
+import argparse
+import contextlib
+import fcntl
+import json
+import os
+import socket
+import threading
+import time
+
+from navigator import build_dependency_graph
+from agents.orchestrator import Orchestrator
+from agents.usage_index import UsageIndex
+from agents.writer import Writer
+from cache import DocstringCache
+from generate_docstrings import add_generation_arguments, llm_client_options, make_llm_client
+from incremental import MANIFEST_NAME, Manifest, plan_incremental, update_manifest
+from tracing import NULL_TRACER, Tracer
+from utils import SourceStore
+
+PLAN_VERSION = 1
+
+
+def node_key_id(node_key):
+    return f"{node_key[0]}:{node_key[1]}"
+
+
+def partition_units(graph, unit_size=256):
+    """
+    Split the condensed SCC DAG into work units of about unit_size components.
+    SCCs are taken in dependency order and never split, so a unit only depends on
+    earlier units and the unit graph stays acyclic.
+
+    Returns:
+        list: dicts with 'id', 'keys' (component ids) and 'depends_on' (unit ids).
+    """
+    groups = graph.topological_sort()
+    # topological_sort puts callers first; dependencies have to be generated first
+    groups.reverse()
+    units, current = [], []
+    for group in groups:
+        if current and len(current) + len(group) > unit_size:
+            units.append(current)
+            current = []
+        current.extend((component.filepath, component.name) for component in group)
+    if current:
+        units.append(current)
+
+    unit_of = {key: index for index, keys in enumerate(units) for key in keys}
+    plan = []
+    for index, keys in enumerate(units):
+        depends_on = {unit_of[callee] for key in keys for callee in graph.edges.get(key, ())} - {index}
+        plan.append({'id': index, 'keys': [node_key_id(key) for key in keys], 'depends_on': sorted(depends_on)})
+    return plan
+
+
+def write_json(path, data):
+    # Readers on other hosts must never see a half-written file
+    tmp_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def status_counts(state):
+    counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+    for entry in state.values():
+        counts[entry['status']] += 1
+    return counts
+
+
+class WorkQueue:
+    """
+    Work units and their state in a shared directory. Every state change happens under
+    an fcntl lock on queue.lock, which NFS also honours and which the OS releases if the
+    holder dies. A claimed unit is leased to one worker until its lease expires, so the
+    units of crashed workers go back to the queue; lease times use each host's clock.
+
+    Layout: plan.json (units, written once), state.json (status per unit) and
+    results/unit-N.json (docstrings of finished units).
+    """
+
+    def __init__(self, queue_dir):
+        self.queue_dir = queue_dir
+        self.plan_path = os.path.join(queue_dir, 'plan.json')
+        self.state_path = os.path.join(queue_dir, 'state.json')
+        self.lock_path = os.path.join(queue_dir, 'queue.lock')
+        self.results_dir = os.path.join(queue_dir, 'results')
+        self._plan = None
+
+    @contextlib.contextmanager
+    def locked(self):
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.lockf(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(lock_file, fcntl.LOCK_UN)
+
+    def create(self, source_dir, units):
+        os.makedirs(self.results_dir, exist_ok=True)
+        with self.locked():
+            if os.path.exists(self.plan_path):
+                raise RuntimeError(f"{self.queue_dir} already holds a plan; use a new queue directory")
+            write_json(self.plan_path, {'version': PLAN_VERSION, 'source_dir': source_dir, 'units': units})
+            write_json(self.state_path, {str(unit['id']): {'status': 'pending', 'claims': 0} for unit in units})
+
+    def plan(self):
+        if self._plan is None:
+            plan = read_json(self.plan_path)
+            if plan.get('version') != PLAN_VERSION:
+                raise RuntimeError(f"Unsupported shard plan version in {self.plan_path}")
+            self._plan = plan
+        return self._plan
+
+    def claim(self, worker_id, lease_seconds, max_claims=3):
+        """
+        Lease the first unit whose dependencies are done. A unit already leased to
+        worker_id is handed back first, so a restarted worker resumes its own work
+        without waiting for the lease to expire.
+
+        Returns:
+            tuple: (unit or None, unit counts by status as seen under the same lock).
+        """
+        now = time.time()
+        with self.locked():
+            state = read_json(self.state_path)
+            done = {unit_id for unit_id, entry in state.items() if entry['status'] == 'done'}
+            chosen = None
+            for unit in self.plan()['units']:
+                unit_id = str(unit['id'])
+                entry = state[unit_id]
+                if entry['status'] == 'leased' and entry['worker'] == worker_id:
+                    chosen = unit
+                    break
+                if chosen is not None or entry['status'] not in ('pending', 'leased'):
+                    continue
+                if entry['status'] == 'leased' and entry['expires'] > now:
+                    continue
+                if all(str(dependency) in done for dependency in unit['depends_on']):
+                    chosen = unit
+            if chosen is None:
+                return None, status_counts(state)
+            entry = state[str(chosen['id'])]
+            if entry['status'] == 'leased' and entry['worker'] != worker_id:
+                print(f"Lease of unit {chosen['id']} held by {entry['worker']} expired; reclaiming it")
+            if entry['claims'] >= max_claims:
+                entry.update(status='failed', error=f"Claimed {entry['claims']} times without finishing")
+                write_json(self.state_path, state)
+                print(f"Unit {chosen['id']} failed: {entry['error']}")
+                return None, status_counts(state)
+            entry.update(status='leased', worker=worker_id, expires=now + lease_seconds, claims=entry['claims'] + 1)
+            write_json(self.state_path, state)
+        return chosen, status_counts(state)
+
+    def renew(self, unit_id, worker_id, lease_seconds):
+        """Extend a lease; returns False if the unit is no longer leased to worker_id."""
+        with self.locked():
+            state = read_json(self.state_path)
+            entry = state[str(unit_id)]
+            if entry['status'] != 'leased' or entry['worker'] != worker_id:
+                return False
+            entry['expires'] = time.time() + lease_seconds
+            write_json(self.state_path, state)
+        return True
+
+    def complete(self, unit_id, worker_id, result):
+        """
+        Publish a unit's result. Only the first completion is kept, so a worker whose
+        lease expired while it was still running cannot duplicate the unit.
+        """
+        result_path = self.result_path(unit_id)
+        tmp_path = f"{result_path}.{worker_id}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        with self.locked():
+            state = read_json(self.state_path)
+            entry = state[str(unit_id)]
+            if entry['status'] == 'done':
+                os.remove(tmp_path)
+                return False
+            os.replace(tmp_path, result_path)
+            entry.update(status='done', worker=worker_id)
+            entry.pop('expires', None)
+            write_json(self.state_path, state)
+        return True
+
+    def release(self, unit_id, worker_id, error, max_claims=3):
+        """Give a unit back after an error; it fails for good after max_claims attempts."""
+        with self.locked():
+            state = read_json(self.state_path)
+            entry = state[str(unit_id)]
+            if entry['status'] != 'leased' or entry['worker'] != worker_id:
+                return
+            entry.update(status='failed' if entry['claims'] >= max_claims else 'pending', error=error)
+            entry.pop('expires', None)
+            write_json(self.state_path, state)
+
+    def counts(self):
+        with self.locked():
+            return status_counts(read_json(self.state_path))
+
+    def result_path(self, unit_id):
+        return os.path.join(self.results_dir, f"unit-{unit_id}.json")
+
+    def load_result(self, unit_id):
+        return read_json(self.result_path(unit_id))
+
+
+class LeaseKeeper(threading.Thread):
+    """Renews a unit's lease in the background while a worker generates it."""
+
+    def __init__(self, queue, unit_id, worker_id, lease_seconds):
+        super().__init__(name=f"lease-{unit_id}", daemon=True)
+        self.queue = queue
+        self.unit_id = unit_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.lease_seconds / 3):
+            if not self.queue.renew(self.unit_id, self.worker_id, self.lease_seconds):
+                print(f"Lost the lease on unit {self.unit_id}; another worker may finish it first")
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class UnitOrchestrator(Orchestrator):
+    """Generates one work unit; docstrings go to the unit result instead of output files."""
+
+    def write_file(self, item):
+        pass
+
+
+def plan_shards(source_dir, queue_dir, unit_size=256, parse_workers=None):
+    print(f"Building dependency graph from: {source_dir}")
+    graph = build_dependency_graph(source_dir, parse_workers)
+    units = partition_units(graph, unit_size)
+    WorkQueue(queue_dir).create(source_dir, units)
+    edges = sum(len(unit['depends_on']) for unit in units)
+    print(f"Planned {len(graph.nodes)} components in {len(units)} work units ({edges} unit dependencies) in {queue_dir}")
+
+
+def run_worker(queue_dir, args, worker_id=None, lease_seconds=300.0, poll_seconds=5.0, max_claims=3):
+    """
+    Claim and generate units until the queue is finished. Results of dependency units
+    supply the docstrings of callees outside the unit.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    queue = WorkQueue(queue_dir)
+    source_dir = queue.plan()['source_dir']
+    tracer = Tracer(args.metrics_path, args.trace_path) if args.metrics_path or args.trace_path else NULL_TRACER
+
+    print(f"Worker {worker_id} building dependency graph from: {source_dir}")
+    graph = build_dependency_graph(source_dir, args.parse_workers)
+    llm_client = make_llm_client(**llm_client_options(args))
+    llm_client.reset_stats()
+    cache = DocstringCache(args.cache_path, args.cache_max_entries) if not args.no_cache else None
+    if args.usage_index_path:
+        usage_index = UsageIndex.load(source_dir, args.usage_index_path)
+        usage_index.save(args.usage_index_path)
+    else:
+        usage_index = UsageIndex(source_dir).build()
+    # One orchestrator serves every unit, so deduplication carries across units
+    orchestrator = UnitOrchestrator(
+        graph, source_dir, queue.results_dir, llm_client, cache,
+        batch_token_budget=args.batch_token_budget, max_batch_size=args.max_batch_size,
+        workers=args.workers, usage_index=usage_index, max_usage_refs=args.max_usage_refs,
+        source_store=SourceStore(args.source_memory_mb * 1024 * 1024),
+        prompt_token_budget=args.prompt_token_budget, queue_size=args.queue_size, tracer=tracer,
+        dedup=not args.no_dedup, dedup_rename=args.dedup_rename, llm_review=not args.no_llm_review,
+        review_rate=args.review_rate, review_threshold=args.review_threshold,
+        max_regenerations=args.max_regenerations)
+
+    finished = 0
+    try:
+        while True:
+            unit, counts = queue.claim(worker_id, lease_seconds, max_claims)
+            if unit is None:
+                if counts['pending'] == 0 and counts['leased'] == 0:
+                    break
+                if counts['leased'] == 0:
+                    # Nothing is running or claimable, so every pending unit waits on a failed one
+                    print(f"{counts['pending']} units are blocked by {counts['failed']} failed units")
+                    break
+                time.sleep(poll_seconds)
+                continue
+
+            keys = set()
+            for key_id in unit['keys']:
+                filepath, name = key_id.rsplit(':', 1)
+                if (filepath, name) not in graph.nodes:
+                    raise RuntimeError(f"{key_id} is not in the source tree; it changed since the plan was made")
+                keys.add((filepath, name))
+            print(f"Worker {worker_id} generating unit {unit['id']} ({len(keys)} components)")
+            stats_before = dict(orchestrator.verification_stats)
+            dedup_before = orchestrator.writer.dedup_saved
+            keeper = LeaseKeeper(queue, unit['id'], worker_id, lease_seconds)
+            keeper.start()
+            try:
+                for dependency in unit['depends_on']:
+                    orchestrator.docstrings.update(queue.load_result(dependency)['docstrings'])
+                orchestrator.run(keys=keys)
+            except Exception as error:
+                keeper.stop()
+                queue.release(unit['id'], worker_id, f"{type(error).__name__}: {error}", max_claims)
+                raise
+            keeper.stop()
+
+            result = {
+                'unit': unit['id'],
+                'worker': worker_id,
+                'docstrings': {key: orchestrator.docstrings[key] for key in unit['keys'] if key in orchestrator.docstrings},
+                'verification': {name: value - stats_before[name]
+                                 for name, value in orchestrator.verification_stats.items()},
+                'dedup_saved': orchestrator.writer.dedup_saved - dedup_before,
+            }
+            if queue.complete(unit['id'], worker_id, result):
+                finished += 1
+            else:
+                print(f"Unit {unit['id']} was already finished by another worker; discarding this result")
+    finally:
+        if cache is not None:
+            cache.close()
+        backend_stats = llm_client.stats_summary()
+        if backend_stats:
+            print(f"Worker {worker_id} backend: {backend_stats}")
+        llm_client.close()
+        if tracer.enabled:
+            tracer.close()
+    print(f"Worker {worker_id} finished {finished} units; queue: {queue.counts()}")
+
+
+def merge_shards(queue_dir, output_dir):
+    """Assemble output_dir and its incremental manifest from the results of every unit."""
+    queue = WorkQueue(queue_dir)
+    counts = queue.counts()
+    if counts['done'] != len(queue.plan()['units']):
+        raise RuntimeError(f"Not every unit is done yet: {counts}")
+    source_dir = queue.plan()['source_dir']
+
+    docstrings = {}
+    totals = {'PASS': 0, 'WARNING': 0, 'FAIL': 0, 'reviewed': 0, 'regenerated': 0, 'dedup_saved': 0}
+    for unit in queue.plan()['units']:
+        result = queue.load_result(unit['id'])
+        docstrings.update(result['docstrings'])
+        for name, value in result['verification'].items():
+            totals[name] += value
+        totals['dedup_saved'] += result['dedup_saved']
+
+    if os.path.exists(output_dir):
+        print(f"Output directory {output_dir} already exists. Removing it.")
+        for root, dirs, files in os.walk(output_dir, topdown=False):
+            for name in files:
+                os.remove(os.path.join(root, name))
+            for name in dirs:
+                os.rmdir(os.path.join(root, name))
+
+    graph = build_dependency_graph(source_dir)
+    records = {}
+    for node_key, component in graph.nodes.items():
+        records.setdefault(component.filepath, []).append({
+            'name': component.name,
+            'type': component.type,
+            'lineno': component.lineno,
+            'docstring': docstrings.get(node_key_id(node_key)),
+        })
+    writer = Writer(source_dir, output_dir)
+    for filepath, file_records in records.items():
+        writer.write_docstrings_for_file(filepath, file_records)
+
+    manifest = Manifest(os.path.join(output_dir, MANIFEST_NAME))
+    update_manifest(manifest, plan_incremental(graph, source_dir, output_dir, manifest), docstrings)
+    print(f"Merged {len(docstrings)} docstrings from {len(queue.plan()['units'])} units into {output_dir}")
+    print(f"Verification: {totals['PASS']} passed, {totals['WARNING']} warnings, {totals['FAIL']} failed, "
+          f"{totals['reviewed']} reviewed by the LLM, {totals['regenerated']} regenerated")
+    print(f"Deduplication saved {totals['dedup_saved']} LLM calls")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run docstring generation as work units shared by many worker processes")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    plan_parser = commands.add_parser('plan', help="Partition the dependency graph and create the work queue")
+    plan_parser.add_argument("--source_dir", type=str, required=True, help="Path to source code directory; use a path every worker can read")
+    plan_parser.add_argument("--queue_dir", type=str, required=True, help="Shared directory for the work queue and unit results")
+    plan_parser.add_argument("--unit_size", type=int, default=256, help="Components per work unit (strongly connected groups are never split)")
+    plan_parser.add_argument("--parse_workers", type=int, default=None, help="Processes used to parse source files (default: CPU count)")
+
+    work_parser = commands.add_parser('work', help="Claim and generate work units until the queue is finished")
+    work_parser.add_argument("--queue_dir", type=str, required=True, help="Shared directory for the work queue and unit results")
+    work_parser.add_argument("--worker_id", type=str, default=None, help="Stable name for this worker, so a restart resumes its leased unit (default: host-pid)")
+    work_parser.add_argument("--lease_seconds", type=float, default=300.0, help="Seconds without a lease renewal before a unit is handed to another worker")
+    work_parser.add_argument("--poll_seconds", type=float, default=5.0, help="Seconds between checks while waiting for dependency units")
+    work_parser.add_argument("--max_claims", type=int, default=3, help="Attempts per unit before it is marked failed")
+    add_generation_arguments(work_parser)
+
+    merge_parser = commands.add_parser('merge', help="Write output_dir from the results of every unit")
+    merge_parser.add_argument("--queue_dir", type=str, required=True, help="Shared directory for the work queue and unit results")
+    merge_parser.add_argument("--output_dir", type=str, required=True, help="Path to output directory for annotated files")
+    args = parser.parse_args()
+
+    if args.command == 'plan':
+        plan_shards(args.source_dir, args.queue_dir, args.unit_size, args.parse_workers)
+    elif args.command == 'work':
+        run_worker(args.queue_dir, args, args.worker_id, args.lease_seconds, args.poll_seconds, args.max_claims)
+    else:
+        merge_shards(args.queue_dir, args.output_dir)
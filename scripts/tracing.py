@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+
+class Span:
+    """One timed stage; extra fields can be attached with set() before it ends."""
+
+    __slots__ = ('tracer', 'name', 'fields', 'start')
+
+    def __init__(self, tracer, name, fields):
+        self.tracer = tracer
+        self.name = name
+        self.fields = fields
+        self.start = None
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.fields['error'] = exc_type.__name__
+        self.tracer.record(self.name, self.start, end - self.start, self.fields)
+        return False
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def set(self, **fields):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class NullTracer:
+    """Tracer used when instrumentation is off; every hook is a no-op."""
+
+    enabled = False
+
+    def span(self, name, **fields):
+        return NULL_SPAN
+
+    def counter(self, name, **values):
+        pass
+
+    def summary(self):
+        return ''
+
+    def close(self):
+        pass
+
+
+NULL_TRACER = NullTracer()
+
+
+class Tracer:
+    """
+    Records stage spans and counters for a run.
+    Every event is appended to a JSON-lines metrics file as it happens; a
+    Chrome trace (chrome://tracing, Perfetto) is written on close().
+    """
+
+    enabled = True
+
+    def __init__(self, metrics_path=None, trace_path=None):
+        self.metrics_path = metrics_path
+        self.trace_path = trace_path
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.trace_events = []
+        self.stages = defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'max': 0.0, 'totals': defaultdict(float)})
+        self._lock = threading.Lock()
+        self._metrics = open(metrics_path, 'w', encoding='utf-8') if metrics_path else None
+
+    def span(self, name, **fields):
+        return Span(self, name, fields)
+
+    def record(self, name, start, duration, fields):
+        event = {'stage': name, 'start': start - self.origin, 'seconds': duration, **fields}
+        with self._lock:
+            stage = self.stages[name]
+            stage['count'] += 1
+            stage['seconds'] += duration
+            stage['max'] = max(stage['max'], duration)
+            for key, value in fields.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    stage['totals'][key] += value
+            if self._metrics is not None:
+                self._metrics.write(json.dumps(event) + '\n')
+            if self.trace_path:
+                self.trace_events.append({
+                    'name': name, 'ph': 'X', 'pid': self.pid, 'tid': threading.get_ident(),
+                    'ts': (start - self.origin) * 1e6, 'dur': duration * 1e6, 'args': fields,
+                })
+
+    def counter(self, name, **values):
+        """Record sampled values such as queue depths."""
+        now = time.perf_counter() - self.origin
+        with self._lock:
+            if self._metrics is not None:
+                self._metrics.write(json.dumps({'counter': name, 'start': now, **values}) + '\n')
+            if self.trace_path:
+                self.trace_events.append({'name': name, 'ph': 'C', 'pid': self.pid, 'ts': now * 1e6, 'args': values})
+
+    def summary(self):
+        """Per-stage table of call counts, wall time and token throughput."""
+        lines = [f"{'stage':<14} {'count':>7} {'total (s)':>10} {'mean (ms)':>10} {'max (ms)':>9}  details"]
+        with self._lock:
+            for name, stage in sorted(self.stages.items(), key=lambda item: -item[1]['seconds']):
+                totals = stage['totals']
+                details = []
+                if 'output_tokens' in totals and stage['seconds']:
+                    details.append(f"{totals['output_tokens'] / stage['seconds']:.1f} output tok/s")
+                for key in ('prompt_tokens', 'output_tokens', 'tokens_dropped', 'cache_hits', 'components'):
+                    if key in totals:
+                        details.append(f"{key}={int(totals[key])}")
+                lines.append(f"{name:<14} {stage['count']:>7} {stage['seconds']:>10.3f} "
+                             f"{stage['seconds'] / stage['count'] * 1000:>10.2f} {stage['max'] * 1000:>9.2f}  "
+                             + ', '.join(details))
+        return '\n'.join(lines)
+
+    def close(self):
+        with self._lock:
+            if self._metrics is not None:
+                self._metrics.close()
+                self._metrics = None
+            if self.trace_path:
+                with open(self.trace_path, 'w', encoding='utf-8') as f:
+                    json.dump({'traceEvents': self.trace_events, 'displayTimeUnit': 'ms'}, f)
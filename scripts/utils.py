@@ -0,0 +1,113 @@
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+
+
+class SourceFile:
+    """Raw bytes (or a memory map) of one file plus the byte offset of every line start."""
+
+    def __init__(self, path, use_mmap):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if use_mmap and size > 0:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.data = f.read()
+        self.offsets = array('q', [0])
+        position = self.data.find(b'\n')
+        while position != -1:
+            self.offsets.append(position + 1)
+            position = self.data.find(b'\n', position + 1)
+        if self.offsets[-1] != len(self.data):
+            self.offsets.append(len(self.data))
+        self.size = len(self.data) + self.offsets.itemsize * len(self.offsets)
+
+    def num_lines(self):
+        return len(self.offsets) - 1
+
+    def segment(self, start, end):
+        """Lines start..end (1-based, inclusive) as text."""
+        start = max(start, 1)
+        end = min(end, self.num_lines())
+        if end < start:
+            return ''
+        return decode(self.data[self.offsets[start - 1]:self.offsets[end]])
+
+    def text(self):
+        return decode(self.data[:])
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+
+def decode(data):
+    # Match the universal-newline behaviour of reading the file in text mode
+    return data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+
+class SourceStore:
+    """
+    Shared cache of source files so each file is read (or mmapped) once per run.
+    Component spans are sliced by line number using precomputed line offsets.
+    Least-recently-used files are dropped once memory_budget bytes are held.
+    """
+
+    def __init__(self, memory_budget=256 * 1024 * 1024, mmap_threshold=1024 * 1024):
+        self.memory_budget = memory_budget
+        self.mmap_threshold = mmap_threshold
+        self.loads = 0
+        self._files = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _get(self, path):
+        # Caller must hold the lock
+        path = os.path.normpath(path)
+        source_file = self._files.get(path)
+        if source_file is not None:
+            self._files.move_to_end(path)
+            return source_file
+        source_file = SourceFile(path, os.path.getsize(path) > self.mmap_threshold)
+        self.loads += 1
+        self._files[path] = source_file
+        self._size += source_file.size
+        while self._size > self.memory_budget and len(self._files) > 1:
+            _, evicted = self._files.popitem(last=False)
+            self._size -= evicted.size
+            evicted.close()
+        return source_file
+
+    def text(self, path):
+        with self._lock:
+            return self._get(path).text()
+
+    def segment(self, path, start, end):
+        with self._lock:
+            return self._get(path).segment(start, end)
+
+    def line(self, path, lineno):
+        return self.segment(path, lineno, lineno).rstrip('\n')
+
+    def invalidate(self, path):
+        with self._lock:
+            source_file = self._files.pop(os.path.normpath(path), None)
+            if source_file is not None:
+                self._size -= source_file.size
+                source_file.close()
+
+    def clear(self):
+        with self._lock:
+            for source_file in self._files.values():
+                source_file.close()
+            self._files.clear()
+            self._size = 0
+
+
+def output_path(output_dir, filepath):
+    """Where the annotated copy of filepath is written; absolute paths are re-rooted under output_dir."""
+    drive, path = os.path.splitdrive(filepath)
+    return os.path.join(output_dir, path.lstrip(os.sep + (os.altsep or '')))